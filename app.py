@@ -2,46 +2,1644 @@ import streamlit as st
 st.set_page_config(page_title="Dashboard Financiero", layout="wide")
 
 import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from datetime import datetime
-import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+import atexit
+import cProfile
+import hashlib
+import importlib
+import io
 import json
+import logging
+import os
+import pstats
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+from formato import fmt, fmt_columna
+from muestreo import espaciadas, reducir_series
+
+# === IMPORTACIONES DIFERIDAS ===
+# Plotly y el cliente de Google Sheets tardan en importarse y no hacen falta
+# para dibujar la página: se importan la primera vez que se usan. Lo que
+# costó cada uno se ve en el panel de diagnóstico.
+
+@st.cache_resource
+def _importaciones():
+    """Módulos importados bajo demanda en este proceso y los segundos que tardaron"""
+    return {}
+
+def importar(modulo):
+    """Importa `modulo` la primera vez que se usa y apunta lo que tardó"""
+    if modulo in sys.modules:
+        return importlib.import_module(modulo)
+    inicio = time.perf_counter()
+    with fase(f"importar {modulo}"):
+        cargado = importlib.import_module(modulo)
+    _importaciones().setdefault(modulo, time.perf_counter() - inicio)
+    return cargado
+
+def _es_error(e, modulo, clase):
+    """`isinstance(e, modulo.clase)` sin importar el módulo: si no está cargado, `e` no puede ser suyo"""
+    cargado = sys.modules.get(modulo)
+    return cargado is not None and isinstance(e, getattr(cargado, clase))
 
 # === CONFIGURACIÓN DE ACCESO A GOOGLE SHEETS ===
 
 scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-creds_dict = json.loads(st.secrets["GOOGLE_SHEETS_CREDS"])
-credentials = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-client = gspread.authorize(credentials)
-
 SHEET_ID = "1W0gOUZFFJHvsP5f6aozHDWt519WEy1u2q8h0nImVCt8"
-workbook = client.open_by_key(SHEET_ID)
-sheet = workbook.sheet1
-sheet_ahorros = workbook.get_worksheet(1)  # Hoja 2 para ahorros
-sheet_metas = workbook.get_worksheet(2)    # Hoja 3 para metas
 
-# === FUNCIONES ===
+@st.cache_resource(show_spinner=False)
+def _conexion():
+    """Autoriza el cliente y abre las hojas una sola vez por proceso.
 
-def cargar_datos():
-    """Carga los datos desde Google Sheets sin caché"""
-    data = sheet.get_all_records()
-    df = pd.DataFrame(data)
+    La sesión autorizada de gspread renueva el token por sí sola cuando
+    expira, así que el cliente se comparte entre todas las sesiones.
+
+    Con FINANZAS_LIBRO_LOCAL (ruta a un SQLite, ver
+    benchmarks/datos_sinteticos.py) se usa en su lugar un libro local que
+    imita la API, sin credenciales; sirve para desarrollar y para los
+    benchmarks. FINANZAS_LATENCIA_MS le añade una espera por llamada.
+    """
+    libro_local = os.environ.get("FINANZAS_LIBRO_LOCAL")
+    if libro_local:
+        from hoja_local import LibroLocal
+        workbook = LibroLocal(libro_local, latencia=float(os.environ.get("FINANZAS_LATENCIA_MS", 0)) / 1000)
+        return {"client": None, "workbook": workbook, "hojas": workbook.worksheets()}
+    with fase("autorización"):
+        gspread = importar("gspread")
+        ServiceAccountCredentials = importar("oauth2client.service_account").ServiceAccountCredentials
+        creds_dict = json.loads(st.secrets["GOOGLE_SHEETS_CREDS"])
+        credentials = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
+        client = gspread.authorize(credentials)
+        sesion = getattr(getattr(client, "http_client", client), "session", None)
+        if sesion is not None:
+            sesion.hooks["response"].append(_contar_bytes)
+        workbook = client.open_by_key(SHEET_ID)
+        # Una sola petición de metadatos para las tres hojas
+        hojas = workbook.worksheets()
+    return {"client": client, "workbook": workbook, "hojas": hojas}
+
+FORMATO_FECHA = {"numberFormat": {"type": "DATE", "pattern": "yyyy-mm-dd"}}
+EPOCA_SHEETS = date(1899, 12, 30)  # día 0 de las fechas de Sheets
+
+def _celda(valor):
+    """Convierte un valor de Python en una celda de la API de Sheets"""
+    if isinstance(valor, datetime):
+        valor = valor.date()
+    if isinstance(valor, date):
+        return {
+            "userEnteredValue": {"numberValue": (valor - EPOCA_SHEETS).days},
+            "userEnteredFormat": FORMATO_FECHA,
+        }
+    if isinstance(valor, (int, float)):
+        return {"userEnteredValue": {"numberValue": valor}}
+    return {"userEnteredValue": {"stringValue": str(valor)}}
+
+def _rango_absoluto(titulo, celdas=None):
+    """Rango A1 con el nombre de la hoja entre comillas, como `gspread.utils.absolute_range_name`"""
+    titulo = "'{}'".format(titulo.replace("'", "''"))
+    return f"{titulo}!{celdas}" if celdas else titulo
+
+def _fallo_de_autorizacion(e):
+    if _es_error(e, "google.auth.exceptions", "RefreshError"):
+        return True
+    return _es_error(e, "gspread.exceptions", "APIError") and e.response.status_code == 401
+
+def _con_reintento(operacion):
+    """Ejecuta `operacion(conexion)`, reconectando una vez si falla la autorización"""
+    try:
+        return operacion(_conexion())
+    except Exception as e:
+        if not _fallo_de_autorizacion(e):
+            raise
+        _conexion.clear()
+        return operacion(_conexion())
+
+# === PASARELA DE LA API ===
+# Todas las llamadas a Sheets pasan por aquí: se reparten la cuota por
+# minuto, se reintentan con espera exponencial los 429 y, en las lecturas,
+# los 5xx y cortes de red, las lecturas idénticas simultáneas se resuelven
+# con una sola petición y se lleva la cuenta de llamadas, bytes, latencias y
+# esperas.
+
+CUOTA_POR_MINUTO = 60   # peticiones por minuto y usuario, de lectura y de escritura por separado
+REINTENTOS = 5          # reintentos ante 429 o, al leer, errores del servidor o de red
+ESPERA_BASE = 1         # segundos antes del primer reintento; se dobla en cada uno
+MUESTRAS_LATENCIA = 500 # latencias guardadas por operación para los percentiles
+
+@st.cache_resource
+def _estado_hilos():
+    """Estado por hilo, el mismo objeto en todas las ejecuciones del script"""
+    return threading.local()
+
+_hilo = _estado_hilos()
+
+def _contar_bytes(respuesta, *args, **kwargs):
+    _hilo.bytes = getattr(_hilo, "bytes", 0) + len(respuesta.content or b"")
+
+def _reintentable(e, tipo):
+    """Si se puede repetir la llamada que falló con `e`.
+
+    Un 429 se rechazó sin aplicarse. Tras un 5xx o un corte de red la
+    escritura pudo llegar a la hoja, y repetirla borraría otra fila o
+    duplicaría las añadidas: solo se repiten las lecturas, y las escrituras
+    vuelven a quien llamó, que comprueba la hoja antes de reintentar (ver
+    `_fila_verificada` y `Diario.enviar`).
+    """
+    if _es_error(e, "gspread.exceptions", "APIError"):
+        codigo = e.response.status_code
+        return codigo == 429 or (codigo >= 500 and tipo == "lectura")
+    if tipo != "lectura":
+        return False
+    return _es_error(e, "requests.exceptions", "ConnectionError") or _es_error(e, "requests.exceptions", "Timeout")
+
+class Cubeta:
+    """Cubeta de fichas: `capacidad` peticiones de golpe y `por_segundo` de ritmo sostenido"""
+
+    def __init__(self, capacidad, por_segundo):
+        self.capacidad = capacidad
+        self.por_segundo = por_segundo
+        self.fichas = capacidad
+        self.momento = time.monotonic()
+        self.lock = threading.Lock()
+
+    def tomar(self):
+        """Reserva una ficha, esperando si hace falta; devuelve los segundos esperados"""
+        with self.lock:
+            ahora = time.monotonic()
+            self.fichas = min(self.capacidad, self.fichas + (ahora - self.momento) * self.por_segundo)
+            self.momento = ahora
+            self.fichas -= 1
+            espera = -self.fichas / self.por_segundo if self.fichas < 0 else 0
+        if espera:
+            time.sleep(espera)
+        return espera
+
+class PasarelaSheets:
+    """Punto único de salida hacia la API de Google Sheets"""
+
+    def __init__(self):
+        self.cubetas = {
+            "lectura": Cubeta(CUOTA_POR_MINUTO, CUOTA_POR_MINUTO / 60),
+            "escritura": Cubeta(CUOTA_POR_MINUTO, CUOTA_POR_MINUTO / 60),
+        }
+        self.lock = threading.Lock()
+        self.en_curso = {}
+        self.estadisticas = {}
+
+    def _estadistica(self, nombre):
+        with self.lock:
+            if nombre not in self.estadisticas:
+                self.estadisticas[nombre] = {
+                    "llamadas": 0, "errores": 0, "reintentos": 0, "esperas": 0,
+                    "compartidas": 0, "bytes": 0, "latencias": deque(maxlen=MUESTRAS_LATENCIA),
+                }
+            return self.estadisticas[nombre]
+
+    def llamar(self, nombre, tipo, operacion, clave=None):
+        """Ejecuta `operacion(conexion)` respetando la cuota.
+
+        Las lecturas con la misma `clave` que ya estén en vuelo esperan a
+        esa petición y reciben su resultado en lugar de repetirla.
+        """
+        if clave is None:
+            return self._ejecutar(nombre, tipo, operacion)
+        with self.lock:
+            llamada = self.en_curso.get(clave)
+            propia = llamada is None
+            if propia:
+                llamada = self.en_curso[clave] = {"listo": threading.Event()}
+        if not propia:
+            llamada["listo"].wait()
+            self._estadistica(nombre)["compartidas"] += 1
+            if "error" in llamada:
+                raise llamada["error"]
+            return llamada["resultado"]
+        try:
+            llamada["resultado"] = self._ejecutar(nombre, tipo, operacion)
+            return llamada["resultado"]
+        except Exception as e:
+            llamada["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.en_curso[clave]
+            llamada["listo"].set()
+
+    def _ejecutar(self, nombre, tipo, operacion):
+        estadistica = self._estadistica(nombre)
+        for intento in range(REINTENTOS + 1):
+            if self.cubetas[tipo].tomar():
+                estadistica["esperas"] += 1
+            _hilo.bytes = 0
+            inicio = time.perf_counter()
+            error = None
+            try:
+                resultado = _con_reintento(operacion)
+            except Exception as e:
+                error = e
+            latencia = time.perf_counter() - inicio
+            estadistica["llamadas"] += 1
+            estadistica["bytes"] += _hilo.bytes
+            estadistica["latencias"].append(latencia)
+            anotar_llamada(nombre, latencia, _hilo.bytes, error)
+            if error is None:
+                return resultado
+            if intento < REINTENTOS and _reintentable(error, tipo):
+                estadistica["reintentos"] += 1
+                time.sleep(ESPERA_BASE * 2 ** intento + random.random())
+                continue
+            estadistica["errores"] += 1
+            raise error
+
+    def resumen(self):
+        """Contadores y percentiles de latencia (ms) por operación"""
+        filas = {}
+        with self.lock:
+            estadisticas = {nombre: dict(e, latencias=list(e["latencias"])) for nombre, e in self.estadisticas.items()}
+        for nombre, e in estadisticas.items():
+            p50, p95, p99 = np.percentile(e["latencias"], [50, 95, 99]) * 1000 if e["latencias"] else (0, 0, 0)
+            filas[nombre] = {
+                "llamadas": e["llamadas"], "errores": e["errores"], "reintentos": e["reintentos"],
+                "esperas por cuota": e["esperas"], "compartidas": e["compartidas"], "bytes": e["bytes"],
+                "p50 ms": round(p50, 1), "p95 ms": round(p95, 1), "p99 ms": round(p99, 1),
+            }
+        return pd.DataFrame.from_dict(filas, orient="index")
+
+@st.cache_resource
+def _pasarela():
+    """Pasarela del proceso, compartida por todas las sesiones"""
+    return PasarelaSheets()
+
+# Operaciones de gspread que solo leen; el resto cuenta como escritura
+LECTURAS = {"get", "get_values", "get_all_values", "get_all_records", "row_values", "col_values", "cell", "acell", "batch_get"}
+
+class HojaCompartida:
+    """Acceso a una hoja del libro a través de la conexión del proceso.
+
+    Si una llamada falla por autorización, descarta la conexión, la vuelve
+    a crear y repite la llamada una vez.
+    """
+
+    def __init__(self, indice):
+        self.indice = indice
+
+    def _llamar(self, nombre, tipo, operacion, clave=None):
+        return _pasarela().llamar(
+            nombre, tipo, lambda conexion: operacion(conexion["hojas"][self.indice]), clave=clave
+        )
+
+    def __getattr__(self, nombre):
+        def llamada(*args, **kwargs):
+            lectura = nombre in LECTURAS
+            clave = (nombre, self.indice, repr(args), repr(sorted(kwargs.items()))) if lectura else None
+            return self._llamar(
+                nombre, "lectura" if lectura else "escritura",
+                lambda hoja: getattr(hoja, nombre)(*args, **kwargs), clave=clave,
+            )
+        return llamada
+
+    def anexar_filas(self, filas):
+        """Añade filas tras la última con datos en una sola petición.
+
+        Las fechas se escriben como fecha de Sheets con su formato aplicado,
+        así que no hace falta averiguar en qué fila quedaron.
+        """
+        def operacion(hoja):
+            return hoja.spreadsheet.batch_update({"requests": [{"appendCells": {
+                "sheetId": hoja.id,
+                "rows": [{"values": [_celda(v) for v in valores]} for valores in filas],
+                "fields": "userEnteredValue,userEnteredFormat.numberFormat",
+            }}]})
+        return self._llamar("appendCells", "escritura", operacion)
+
+    def actualizar_celdas(self, fila, cambios):
+        """Escribe varias celdas de una fila en una única petición atómica.
+
+        `cambios` relaciona el índice de columna (desde 0) con su nuevo valor;
+        las celdas que no aparecen no se tocan.
+        """
+        def operacion(hoja):
+            requests = []
+            for columna, valor in cambios.items():
+                celda = _celda(valor)
+                requests.append({"updateCells": {
+                    "start": {"sheetId": hoja.id, "rowIndex": fila - 1, "columnIndex": columna},
+                    "rows": [{"values": [celda]}],
+                    "fields": ",".join(
+                        ["userEnteredValue"] + (["userEnteredFormat.numberFormat"] if "userEnteredFormat" in celda else [])
+                    ),
+                }})
+            return hoja.spreadsheet.batch_update({"requests": requests})
+        return self._llamar("updateCells", "escritura", operacion)
+
+    def escribir_columna(self, columna, valores, fila=1):
+        """Escribe una columna desde `fila` (la cabecera por defecto) en una sola petición"""
+        def operacion(hoja):
+            return hoja.spreadsheet.batch_update({"requests": [{"updateCells": {
+                "start": {"sheetId": hoja.id, "rowIndex": fila - 1, "columnIndex": columna},
+                "rows": [{"values": [_celda(valor)]} for valor in valores],
+                "fields": "userEnteredValue",
+            }}]})
+        return self._llamar("escribir_columna", "escritura", operacion)
+
+    def leer_fila(self, fila):
+        """Valores sin formato de una sola fila"""
+        def operacion(hoja):
+            rango = _rango_absoluto(hoja.title, f"{fila}:{fila}")
+            respuesta = hoja.spreadsheet.values_batch_get([rango], params=LECTURA)
+            valores = respuesta["valueRanges"][0].get("values", [])
+            return valores[0] if valores else []
+        return self._llamar("leer_fila", "lectura", operacion, clave=("leer_fila", self.indice, fila))
+
+sheet = HojaCompartida(0)
+sheet_ahorros = HojaCompartida(1)  # Hoja 2 para ahorros
+sheet_metas = HojaCompartida(2)    # Hoja 3 para metas
+
+# === TRAZAS ===
+# Tiempo de cada fase de una ejecución de la página y de cada llamada a la
+# API hecha durante ella. Las últimas ejecuciones de cada sesión se ven en el
+# panel de diagnóstico; con FINANZAS_TRAZAS, además, cada una se añade como
+# una línea JSON a ese fichero.
+
+RUTA_TRAZAS = os.environ.get("FINANZAS_TRAZAS")
+# El panel de diagnóstico y el perfil solo se pueden abrir en los despliegues
+# que lo permiten con FINANZAS_DIAGNOSTICO=1; si no, cualquier visitante
+# podría verlos y lanzar perfiles añadiendo un parámetro a la dirección
+DIAGNOSTICO = os.environ.get("FINANZAS_DIAGNOSTICO") == "1"
+TRAZAS_POR_SESION = 20
+
+@st.cache_resource
+def _escritura_trazas():
+    return threading.Lock()
+
+def iniciar_traza():
+    """Empieza a medir la ejecución de la página que corre en este hilo"""
+    anterior = st.session_state.pop("traza_en_curso", None)
+    if anterior is not None:
+        # La ejecución anterior la cortó un st.rerun() antes de llegar al final
+        _cerrar_traza(anterior, interrumpida=True)
+    ahora = time.perf_counter()
+    traza = {"inicio": time.time(), "reloj": ahora, "fin": ahora, "fases": {}, "pila": [], "llamadas": []}
+    st.session_state["traza_en_curso"] = traza
+    _hilo.traza = traza
+
+@contextmanager
+def fase(nombre):
+    """Mide un bloque de la ejecución en curso; las fases anidadas se llaman `padre › hija`"""
+    traza = getattr(_hilo, "traza", None)
+    if traza is None:
+        yield
+        return
+    traza["pila"].append(nombre)
+    ruta = " › ".join(traza["pila"])
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        traza["fin"] = time.perf_counter()
+        traza["fases"][ruta] = traza["fases"].get(ruta, 0) + (traza["fin"] - inicio) * 1000
+        traza["pila"].pop()
+
+def anotar_llamada(nombre, segundos, bytes_recibidos, error=None):
+    """Apunta una llamada a la API en la traza del hilo, si la hay"""
+    traza = getattr(_hilo, "traza", None)
+    if traza is not None:
+        traza["llamadas"].append({
+            "operacion": nombre,
+            "ms": round(segundos * 1000, 1),
+            "bytes": bytes_recibidos,
+            "error": None if error is None else type(error).__name__,
+        })
+
+def terminar_traza():
+    """Cierra la traza de la ejecución en curso y la guarda"""
+    _hilo.traza = None
+    traza = st.session_state.pop("traza_en_curso", None)
+    if traza is not None:
+        traza["fin"] = time.perf_counter()
+        _cerrar_traza(traza)
+
+def _cerrar_traza(traza, interrumpida=False):
+    registro = {
+        "inicio": datetime.fromtimestamp(traza["inicio"]).isoformat(timespec="seconds"),
+        "total_ms": round((traza["fin"] - traza["reloj"]) * 1000, 1),
+        "interrumpida": interrumpida,
+        "fases": {nombre: round(ms, 1) for nombre, ms in traza["fases"].items()},
+        "llamadas": traza["llamadas"],
+    }
+    if "trazas" not in st.session_state:
+        st.session_state["trazas"] = deque(maxlen=TRAZAS_POR_SESION)
+    st.session_state["trazas"].append(registro)
+    if RUTA_TRAZAS:
+        with _escritura_trazas(), open(RUTA_TRAZAS, "a", encoding="utf-8") as fichero:
+            fichero.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+def iniciar_perfil():
+    """Con DIAGNOSTICO y ?perfil=1, perfila con cProfile la ejecución entera; sale en el panel de diagnóstico"""
+    # Si la ejecución perfilada la cortó un st.rerun() o una excepción, el
+    # perfil sigue activo: se cierra con lo que llegó a medir
+    terminar_perfil()
+    if not DIAGNOSTICO or st.query_params.get("perfil") != "1":
+        return
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        # Otra sesión se está perfilando en este momento
+        return
+    st.session_state["perfil_en_curso"] = perfil
+
+def terminar_perfil():
+    perfil = st.session_state.pop("perfil_en_curso", None)
+    if perfil is None:
+        return
+    perfil.disable()
+    salida = io.StringIO()
+    pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(40)
+    st.session_state["perfil"] = salida.getvalue()
+    # Solo se perfila una ejecución
+    if "perfil" in st.query_params:
+        del st.query_params["perfil"]
+
+def resumen_trazas(trazas):
+    """Una fila por ejecución con su total, sus llamadas a la API y el tiempo de cada fase"""
+    filas = []
+    for traza in trazas:
+        filas.append({
+            "inicio": traza["inicio"],
+            "total ms": traza["total_ms"],
+            "llamadas": len(traza["llamadas"]),
+            "bytes": sum(llamada["bytes"] for llamada in traza["llamadas"]),
+            **traza["fases"],
+        })
+    return pd.DataFrame(filas[::-1])
+
+# === CACHÉ DE DATOS ===
+
+# Segundos que una lectura sigue vigente. Al caducar solo se leen las filas
+# añadidas tras la última leída, así que las filas que se añadan
+# directamente en la hoja, fuera de la app, tardan hasta CACHE_TTL en verse.
+# Las ediciones y borrados de filas ya leídas solo aparecen con la lectura
+# completa que se hace cada INTERVALO_VERIFICACION (ver "INSTANTÁNEAS EN
+# DISCO"): hasta INTERVALO_VERIFICACION + CACHE_TTL después.
+CACHE_TTL = 300
+
+HOJAS = {"movimientos": 0, "ahorros": 1, "metas": 2}  # nombre -> posición en el libro
+
+@st.cache_resource
+def _almacen():
+    """Datos cargados de cada hoja y su versión, compartidos por todas las sesiones.
+
+    Los DataFrames guardados aquí los leen todas las sesiones: no se modifican
+    en sitio.
+    """
+    return {
+        "lock": threading.Lock(),
+        "versiones": {hoja: 0 for hoja in HOJAS},
+        "cargas": {},
+        # Años archivados (ver `resumen_archivo`): no tienen versión porque no cambian
+        "archivo": {"resumen": None, "particiones": {}, "version": 0},
+    }
+
+def invalidar(hoja, ajuste_cubo=None, parche=None, filas_hoja=0, ajuste_saldo=None):
+    """Marca como obsoleta la caché de una hoja tras escribir en ella.
+
+    `ajuste_cubo` es un `(mes, tipo, importe)`, o una lista de ellos, que se
+    suma al cubo mensual para que siga valiendo en la nueva versión sin
+    recalcularlo. `ajuste_saldo` hace lo mismo con el saldo de ahorros: una
+    lista de `(fecha, monto, veces)`, con `veces` 1 para un aporte nuevo y
+    -1 para uno que desaparece.
+
+    `parche(df, cabecera)` devuelve los datos con el cambio ya aplicado; si la
+    carga estaba al día se usa como nueva versión y la hoja no se vuelve a
+    descargar. `filas_hoja` es cuántas filas ganó o perdió la hoja con el
+    cambio, para que la siguiente lectura incremental empiece donde toca.
+    """
+    almacen = _almacen()
+    with almacen["lock"]:
+        carga = almacen["cargas"].get(hoja)
+        al_dia = carga is not None and carga["version"] == almacen["versiones"][hoja]
+        if ajuste_cubo is not None:
+            _ajustar_cubo(almacen, [ajuste_cubo] if isinstance(ajuste_cubo, tuple) else ajuste_cubo)
+        if ajuste_saldo is not None:
+            _ajustar_saldo(almacen, ajuste_saldo)
+        almacen["versiones"][hoja] += 1
+        if parche is not None and al_dia:
+            almacen["cargas"][hoja] = {
+                **carga,
+                "version": almacen["versiones"][hoja],
+                "df": parche(carga["df"], carga["cabecera"]),
+                "filas": carga["filas"] + filas_hoja,
+                "derivados": {},
+            }
+            _guardar_instantanea(hoja, almacen["cargas"][hoja])
+
+def versiones_vigentes():
+    """Versión actual de cada hoja; si cambia, los datos que vio una sesión ya no son los últimos"""
+    almacen = _almacen()
+    with almacen["lock"]:
+        return dict(almacen["versiones"])
+
+def _vigente(almacen, hoja):
+    carga = almacen["cargas"].get(hoja)
+    return (
+        carga is not None
+        and carga["version"] == almacen["versiones"][hoja]
+        and time.monotonic() - carga["leido"] < CACHE_TTL
+    )
+
+# Valores sin formato: los números llegan como números y las fechas como
+# número de serie, sin depender del formato de cada celda
+LECTURA = {"valueRenderOption": "UNFORMATTED_VALUE", "dateTimeRenderOption": "SERIAL_NUMBER"}
+
+def _leer_rangos(desde):
+    """Lee varias hojas con una sola petición batchGet.
+
+    `desde` relaciona cada hoja con la fila a partir de la que se lee, o con
+    `None` para leerla completa, cabecera incluida.
+    """
+    hojas = list(desde)
+
+    def rango(titulo, fila):
+        # Sin fila final: llega hasta la última fila con datos
+        return _rango_absoluto(titulo) if fila is None else _rango_absoluto(titulo, f"A{fila}:ZZ")
+
+    def operacion(conexion):
+        rangos = [rango(conexion["hojas"][HOJAS[hoja]].title, desde[hoja]) for hoja in hojas]
+        respuesta = conexion["workbook"].values_batch_get(rangos, params=LECTURA)
+        return [rango.get("values", []) for rango in respuesta["valueRanges"]]
+    clave = ("batchGet", tuple(desde.items()))
+    return dict(zip(hojas, _pasarela().llamar("batchGet", "lectura", operacion, clave=clave)))
+
+def _columnas(valores, numericas=(), primera_fila=2):
+    """Convierte las filas de un rango (con cabecera) en un DataFrame columna a columna.
+
+    El índice es el id de cada registro y la columna `fila` su número de
+    fila en la hoja; las filas en blanco se descartan.
+    """
+    if not valores:
+        return pd.DataFrame()
+    cabecera, filas = valores[0], valores[1:]
+    ancho = len(cabecera)
+    # La API omite las celdas vacías al final de cada fila
+    filas = [fila[:ancho] + [""] * (ancho - len(fila)) for fila in filas]
+    columnas = list(zip(*filas)) or [()] * ancho
+    df = pd.DataFrame({nombre: list(columna) for nombre, columna in zip(cabecera, columnas)})
+    df["fila"] = np.arange(primera_fila, primera_fila + len(df))
+    df = df[(df[cabecera] != "").any(axis=1)]
+    if "id" in df:
+        df = df.set_index(df.pop("id").astype(str).rename("id"))
+    for nombre in numericas:
+        if nombre in df:
+            df[nombre] = pd.to_numeric(df[nombre], errors="coerce")
+    return df
+
+def _fechas(columna):
+    """Convierte una columna de fechas de Sheets en datetime64.
+
+    Las fechas llegan como número de serie; las filas antiguas guardadas como
+    texto (a veces con un `'` delante) se leen con formato ISO fijo.
+    """
+    serie = pd.Series(columna, dtype=object)
+    numeros = pd.to_numeric(serie, errors="coerce")
+    fechas = pd.to_datetime(numeros, unit="D", origin=pd.Timestamp(EPOCA_SHEETS))
+    texto = numeros.isna() & serie.ne("")
+    if texto.any():
+        fechas[texto] = pd.to_datetime(serie[texto].astype(str).str.lstrip("'"), format="ISO8601")
+    return fechas
+
+# Tipos de las columnas de movimientos en memoria. `mes` es un Period
+# mensual (un entero por fila) y el nombre se guarda en Arrow.
+ESQUEMA_MOVIMIENTOS = {
+    "fecha": "datetime64[ns]",
+    "nombre": "string[pyarrow]",
+    "importe": "int64",
+    "tipo_movimiento": "category",
+    "mes": "period[M]",
+}
+
+def _decodificar_movimientos(valores, primera_fila=2):
+    df = _columnas(valores, numericas=["importe"], primera_fila=primera_fila)
+    # También sin filas, para que un libro nuevo tenga las columnas y sus tipos
+    if "fecha" in df:
+        df["fecha"] = _fechas(df["fecha"]).astype(ESQUEMA_MOVIMIENTOS["fecha"])
+        df["nombre"] = df["nombre"].astype(str).astype(ESQUEMA_MOVIMIENTOS["nombre"])
+        df["importe"] = df["importe"].fillna(0).round().astype(ESQUEMA_MOVIMIENTOS["importe"])
+        df["tipo_movimiento"] = df["tipo_movimiento"].astype(str).astype(ESQUEMA_MOVIMIENTOS["tipo_movimiento"])
+        df["mes"] = df["fecha"].dt.to_period("M")
+        # Ordenado por fecha para poder cortar periodos con búsqueda binaria
+        df = df.sort_values("fecha", kind="stable", na_position="first")
+    return df
+
+class IndiceFechas:
+    """Límites de cada año y mes dentro del ledger ordenado por fecha.
+
+    Filtrar un periodo es una búsqueda binaria que devuelve una rebanada
+    del DataFrame, sin recorrer la columna de fechas.
+    """
+
+    def __init__(self, df):
+        # Ordinal del mes de cada fila (meses desde 1970-01); NaT queda al principio
+        self.ordinales = df["mes"].array.asi8 if "mes" in df else np.array([], dtype="int64")
+        validos = self.ordinales[self.ordinales != pd.NaT.value] if len(self.ordinales) else self.ordinales
+        self.meses_ordinales = np.unique(validos)
+        self.años_disponibles = np.unique(self.meses_ordinales // 12 + 1970).tolist()
+
+    def años(self):
+        return self.años_disponibles
+
+    def meses(self, año):
+        """Meses con movimientos en un año, en orden"""
+        if año is None:
+            # Aún no hay movimientos: no hay año que elegir
+            return []
+        desde, hasta = np.searchsorted(self.meses_ordinales, [(año - 1970) * 12, (año - 1969) * 12])
+        return [pd.Period(ordinal=int(o), freq="M") for o in self.meses_ordinales[desde:hasta]]
+
+    def rebanada(self, df, año=None, mes=None):
+        """Filas de un año o de un mes concreto; ninguna si no se eligió ninguno"""
+        if año is None and mes is None:
+            return df.iloc[:0]
+        if mes is not None:
+            inicio = fin = mes.ordinal
+        else:
+            inicio, fin = (año - 1970) * 12, (año - 1970) * 12 + 11
+        desde, hasta = np.searchsorted(self.ordinales, [inicio, fin + 1])
+        return df.iloc[desde:hasta]
+
+def indice_fechas(df):
+    """Índice de fechas del ledger, compartido mientras no cambien los datos"""
+    return derivado("movimientos", df, "indice_fechas", IndiceFechas)
+
+def _normalizar(textos):
+    """Minúsculas y sin tildes, para comparar nombres sin importar cómo se escribieron"""
+    textos = pd.Series(textos, dtype="string[pyarrow]")
+    textos = textos.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+    return pa.array(textos.str.lower(), type=pa.string())
+
+class IndiceBusqueda:
+    """Nombres normalizados del ledger para buscar por subcadena sin regex"""
+
+    def __init__(self, df):
+        self.nombres = _normalizar(df["nombre"] if "nombre" in df else [])
+
+    def buscar(self, texto):
+        """Posiciones (en el orden del ledger) cuyo nombre contiene `texto`"""
+        if not texto:
+            return np.arange(len(self.nombres))
+        patron = _normalizar([texto])[0].as_py()
+        coincide = pc.match_substring(self.nombres, patron)
+        return np.flatnonzero(coincide.fill_null(False).to_numpy(zero_copy_only=False))
+
+def indice_busqueda(df):
+    """Índice de búsqueda por nombre, compartido mientras no cambien los datos"""
+    return derivado("movimientos", df, "indice_busqueda", IndiceBusqueda)
+
+def construir_cubo(df):
+    """Suma de importes por mes (filas) y categoría (columnas)"""
+    if df.empty:
+        return pd.DataFrame(index=pd.PeriodIndex([], freq="M", name="mes"), dtype="int64")
+    tabla = df.groupby(["mes", "tipo_movimiento"], observed=True)["importe"].sum().unstack(fill_value=0)
+    tabla.columns = tabla.columns.astype(str)
+    return tabla
+
+def cubo_mensual(df):
+    """Cubo mes × categoría de la versión de datos de `df`.
+
+    Se construye una vez por versión; las altas y bajas hechas desde la app
+    lo ajustan celda a celda (ver `invalidar`), así que no se recalcula
+    tras cada escritura.
+    """
+    almacen = _almacen()
+    with almacen["lock"]:
+        carga = almacen["cargas"].get("movimientos")
+        if carga is None or carga["df"] is not df:
+            return construir_cubo(df)
+        cubo = almacen.get("cubo")
+        if cubo is None or cubo["version"] != carga["version"]:
+            cubo = {"version": carga["version"], "tabla": construir_cubo(df)}
+            almacen["cubo"] = cubo
+        return cubo["tabla"]
+
+def _ajustar_cubo(almacen, ajustes):
+    # Solo se ajusta un cubo al día; si no, se reconstruirá en la próxima carga.
+    # Se trabaja sobre una copia (meses × categorías, unas pocas celdas) para
+    # no cambiar la tabla que otras sesiones pueden estar leyendo.
+    cubo = almacen.get("cubo")
+    version = almacen["versiones"]["movimientos"]
+    if cubo is None or cubo["version"] != version:
+        return
+    tabla = cubo["tabla"].copy()
+    for mes, tipo, importe in ajustes:
+        # Como en `construir_cubo`, los movimientos sin fecha o sin tipo no cuentan
+        if pd.isna(mes) or pd.isna(tipo):
+            continue
+        if tipo not in tabla.columns:
+            tabla[tipo] = 0
+        if mes not in tabla.index:
+            tabla.loc[mes] = 0
+            tabla = tabla.sort_index()
+        tabla.loc[mes, tipo] += importe
+    almacen["cubo"] = {"version": version + 1, "tabla": tabla}
+
+def periodo_cubo(cubo, año, mes="Todos"):
+    """Filas del cubo del año o mes seleccionado, sin meses ni categorías vacíos"""
+    if mes != "Todos":
+        tabla = cubo[cubo.index == mes]
+    else:
+        tabla = cubo[cubo.index.year == año]
+    tabla = tabla.loc[(tabla != 0).any(axis=1), (tabla != 0).any(axis=0)]
+    return tabla
+
+# Días de ahorros recientes con los que se estima el ritmo de ahorro
+VENTANA_RITMO = 90
+HORIZONTE_METAS = 100 * 365  # días; más allá no se da fecha prevista
+
+class SaldoAhorros:
+    """Saldo acumulado de los ahorros, ordenado por fecha, y su total.
+
+    Es inmutable: `con_ajustes` devuelve una copia con aportes añadidos o
+    quitados, insertándolos en su sitio y corrigiendo el acumulado de los
+    posteriores, sin reordenar ni volver a sumar todo.
+    """
+
+    def __init__(self, fechas, montos, acumulado, total):
+        self.fechas = fechas
+        self.montos = montos
+        self.acumulado = acumulado
+        self.total = total
+
+    @classmethod
+    def desde(cls, df):
+        if df.empty:
+            vacio = np.array([], dtype="float64")
+            return cls(np.array([], dtype="datetime64[ns]"), vacio, vacio, 0.0)
+        montos = df["monto"].fillna(0).astype("float64")
+        # Sin fecha cuentan para el total pero no tienen sitio en la curva
+        con_fecha = df["fecha"].notna()
+        serie = pd.DataFrame({"fecha": df["fecha"][con_fecha], "monto": montos[con_fecha]})
+        serie = serie.sort_values("fecha", kind="stable")
+        fechas = serie["fecha"].to_numpy(dtype="datetime64[ns]")
+        return cls(fechas, serie["monto"].to_numpy(), serie["monto"].cumsum().to_numpy(), float(montos.sum()))
+
+    def con_ajustes(self, ajustes):
+        """Copia con cada `(fecha, monto, veces)` aplicado; None si falta un aporte que quitar"""
+        fechas, montos, acumulado, total = self.fechas, self.montos, self.acumulado.copy(), self.total
+        for fecha, monto, veces in ajustes:
+            monto = float(monto)
+            total += veces * monto
+            if pd.isna(fecha):
+                continue
+            fecha = np.datetime64(pd.Timestamp(fecha), "ns")
+            if veces > 0:
+                pos = int(np.searchsorted(fechas, fecha, side="right"))
+                base = acumulado[pos - 1] if pos else 0.0
+                fechas, montos = np.insert(fechas, pos, fecha), np.insert(montos, pos, monto)
+                acumulado = np.insert(acumulado, pos, base)
+                acumulado[pos:] += monto
+            else:
+                desde, hasta = np.searchsorted(fechas, fecha, side="left"), np.searchsorted(fechas, fecha, side="right")
+                iguales = np.flatnonzero(montos[desde:hasta] == monto)
+                if not len(iguales):
+                    return None
+                pos = int(desde + iguales[-1])
+                fechas, montos = np.delete(fechas, pos), np.delete(montos, pos)
+                acumulado = np.delete(acumulado, pos)
+                acumulado[pos:] -= monto
+        return SaldoAhorros(fechas, montos, acumulado, total)
+
+    def acumulado_hasta(self, fecha):
+        """Ahorrado hasta `fecha` (incluida) según la curva"""
+        pos = int(np.searchsorted(self.fechas, np.datetime64(pd.Timestamp(fecha), "ns"), side="right"))
+        return float(self.acumulado[pos - 1]) if pos else 0.0
+
+    def ritmo_diario(self, hoy, dias=VENTANA_RITMO):
+        """Ahorro medio por día de los últimos `dias` días"""
+        return (self.acumulado_hasta(hoy) - self.acumulado_hasta(hoy - pd.Timedelta(days=dias))) / dias
+
+def saldo_ahorros(df):
+    """Saldo de ahorros de la versión de datos de `df`, como `cubo_mensual`"""
+    almacen = _almacen()
+    with almacen["lock"]:
+        carga = almacen["cargas"].get("ahorros")
+        if carga is None or carga["df"] is not df:
+            return SaldoAhorros.desde(df)
+        saldo = almacen.get("saldo")
+        if saldo is None or saldo["version"] != carga["version"]:
+            saldo = {"version": carga["version"], "saldo": SaldoAhorros.desde(df)}
+            almacen["saldo"] = saldo
+        return saldo["saldo"]
+
+def _ajustar_saldo(almacen, ajustes):
+    # Como el cubo: solo se ajusta un saldo al día, sobre una copia
+    saldo = almacen.get("saldo")
+    version = almacen["versiones"]["ahorros"]
+    if saldo is None or saldo["version"] != version:
+        return
+    nuevo = saldo["saldo"].con_ajustes(ajustes)
+    if nuevo is None:
+        # No cuadra con lo cargado: se reconstruirá con los datos nuevos
+        del almacen["saldo"]
+        return
+    almacen["saldo"] = {"version": version + 1, "saldo": nuevo}
+
+def evaluar_metas(df_metas, saldo, hoy=None):
+    """Progreso y fecha prevista de todas las metas en una sola pasada.
+
+    Todas las metas se miden contra el total ahorrado. La fecha prevista
+    supone que se sigue ahorrando al ritmo de los últimos VENTANA_RITMO
+    días; queda vacía si la meta ya se alcanzó o si a ese ritmo no se llega
+    antes de HORIZONTE_METAS.
+    """
+    hoy = pd.Timestamp.today().normalize() if hoy is None else pd.Timestamp(hoy)
+    objetivo = df_metas["meta_total"].to_numpy(dtype="float64", na_value=np.nan)
+    con_objetivo = objetivo > 0
+    progreso = np.divide(saldo.total * 100, objetivo, out=np.full(len(objetivo), 100.0), where=con_objetivo)
+    faltante = np.where(con_objetivo, np.maximum(objetivo - saldo.total, 0), 0)
+    ritmo = saldo.ritmo_diario(hoy)
+    dias = np.ceil(faltante / ritmo) if ritmo > 0 else np.full(len(objetivo), np.nan)
+    dias[(faltante == 0) | (dias > HORIZONTE_METAS)] = np.nan
+    prevista = hoy + pd.to_timedelta(dias, unit="D")
+    return pd.DataFrame({
+        "progreso": np.clip(progreso, 0, 100),
+        "faltante": faltante,
+        "fecha_prevista": prevista,
+        "a_tiempo": prevista <= df_metas["fecha_meta"].to_numpy(),
+    }, index=df_metas.index)
+
+def reporte_memoria(df):
+    """Tipo y bytes ocupados por cada columna de un DataFrame"""
+    reporte = pd.DataFrame({
+        "tipo": df.dtypes.astype(str),
+        "bytes": df.memory_usage(index=False, deep=True),
+    })
+    reporte.loc["Total"] = ["", int(reporte["bytes"].sum())]
+    return reporte
+
+def _decodificar_ahorros(valores, primera_fila=2):
+    df = _columnas(valores, numericas=["monto"], primera_fila=primera_fila)
+    if not df.empty:
+        df["fecha"] = _fechas(df["fecha"])
+    return df
+
+def _decodificar_metas(valores, primera_fila=2):
+    df = _columnas(valores, numericas=["meta_total"], primera_fila=primera_fila)
     if not df.empty:
-        df["fecha"] = df["fecha"].astype(str).str.replace("'", "")
-        df["fecha"] = pd.to_datetime(df["fecha"])
-        df["mes"] = df["fecha"].dt.to_period("M").astype(str)
+        df["fecha_meta"] = _fechas(df["fecha_meta"])
     return df
 
+DECODIFICADORES = {
+    "movimientos": _decodificar_movimientos,
+    "ahorros": _decodificar_ahorros,
+    "metas": _decodificar_metas,
+}
+
+def nuevo_id():
+    """Identificador estable para un registro nuevo"""
+    return uuid.uuid4().hex[:16]
+
+def _asegurar_ids(hoja, valores, escrituras, primera_fila=2):
+    """Da un id a las filas que no lo tienen y encarga guardarlo en la columna `id`.
+
+    Solo hay que escribir cuando falta alguno (la primera vez, o tras añadir
+    filas a mano en la hoja). La escritura no se hace aquí, que corre con el
+    candado del almacén tomado: se añade a `escrituras` y la hace
+    `_escribir_ids` tras soltarlo. `primera_fila` es la fila de la hoja que
+    ocupa `valores[1]`, por si solo se leyó una parte.
+    """
+    if not valores:
+        return valores
+    cabecera = list(valores[0])
+    if "id" not in cabecera:
+        cabecera.append("id")
+    columna = cabecera.index("id")
+    filas = [cabecera]
+    nueva_columna = columna >= len(valores[0])
+    faltan = nueva_columna
+    for fila in valores[1:]:
+        fila = list(fila) + [""] * (len(cabecera) - len(fila))
+        if fila[columna] == "" and any(valor != "" for valor in fila):
+            fila[columna] = nuevo_id()
+            faltan = True
+        filas.append(fila)
+    if faltan:
+        ids = [fila[columna] for fila in filas]
+        if nueva_columna:
+            escrituras.append((hoja, columna, ids, 1))
+        else:
+            escrituras.append((hoja, columna, ids[1:], primera_fila))
+    return filas
+
+def _escribir_ids(almacen, escrituras):
+    """Escribe en la hoja los ids que encargó `_asegurar_ids`, sin el candado del almacén.
+
+    Cada columna va en lotes de LOTE_ENVIO filas, como los envíos del diario.
+    Si una escritura falla, la carga en memoria tiene ids que la hoja no
+    tiene: se marca obsoleta para que la próxima carga lea la hoja entera y
+    vuelva a darlos.
+    """
+    for hoja, columna, ids, fila in escrituras:
+        try:
+            for inicio in range(0, len(ids), LOTE_ENVIO):
+                HojaCompartida(HOJAS[hoja]).escribir_columna(
+                    columna, ids[inicio:inicio + LOTE_ENVIO], fila=fila + inicio
+                )
+        except Exception:
+            with almacen["lock"]:
+                almacen["versiones"][hoja] += 1
+            raise
+
+def _suma(valores):
+    """Suma de comprobación del contenido leído de una hoja"""
+    return hashlib.sha1(json.dumps(valores, separators=(",", ":"), default=str).encode()).hexdigest()
+
+def _fila_inicial(almacen, hoja):
+    """Fila desde la que hay que releer una hoja, o `None` si toca leerla entera.
+
+    Se lee entera si no hay carga, si se invalidó o si pasó el intervalo de
+    verificación; si no, basta con las filas añadidas tras la última leída.
+    """
+    carga = almacen["cargas"].get(hoja)
+    if (
+        carga is None
+        or not carga["cabecera"]
+        or carga["version"] != almacen["versiones"][hoja]
+        or time.time() - carga["verificado"] >= INTERVALO_VERIFICACION
+    ):
+        return None
+    return carga["filas"] + 1
+
+def _carga_completa(almacen, hoja, valores, escrituras):
+    """Carga nueva a partir de la hoja entera"""
+    valores = _asegurar_ids(hoja, valores, escrituras)
+    suma = _suma(valores)
+    anterior = almacen["cargas"].get(hoja)
+    if anterior is not None and anterior["version"] == almacen["versiones"][hoja]:
+        if anterior["suma"] == suma:
+            # Verificación sin cambios: se conservan los datos y lo ya calculado
+            return {**anterior, "verificado": time.time()}
+        # Alguien cambió filas antiguas fuera de la app: es una versión nueva
+        almacen["versiones"][hoja] += 1
+    cabecera = valores[0] if valores else []
+    with fase("decodificación"):
+        df = _con_pendientes(hoja, DECODIFICADORES[hoja](valores), cabecera)
+    return {
+        "version": almacen["versiones"][hoja],
+        "cabecera": cabecera,
+        "df": df,
+        "filas": len(valores),
+        "suma": suma,
+        "verificado": time.time(),
+        "derivados": {},
+    }
+
+def _carga_incremental(almacen, hoja, filas, desde, escrituras):
+    """Añade a la carga vigente las filas leídas a partir de la fila `desde`"""
+    carga = almacen["cargas"][hoja]
+    if not filas:
+        return carga
+    cabecera = carga["cabecera"]
+    filas = _asegurar_ids(hoja, [cabecera] + filas, escrituras, primera_fila=desde)[1:]
+    with fase("decodificación"):
+        nuevo = DECODIFICADORES[hoja]([cabecera] + filas, primera_fila=desde)
+    df = carga["df"]
+    # Las altas hechas desde la app ya estaban en memoria como pendientes:
+    # solo se corrige la fila que les tocó de verdad
+    enviados = nuevo.index.intersection(df.index)
+    if len(enviados):
+        df = df.copy()
+        df.loc[enviados, "fila"] = nuevo.loc[enviados, "fila"]
+        nuevo = nuevo.drop(index=enviados)
+    almacen["versiones"][hoja] += 1
+    return {
+        **carga,
+        "version": almacen["versiones"][hoja],
+        "df": _unir(hoja, df, nuevo),
+        "filas": desde + len(filas) - 1,
+        "derivados": {},
+    }
+
+INTENTOS_SIN_CANDADO = 3  # lecturas descartadas por escrituras simultáneas antes de leer con el candado
+
+def cargar_hojas(hojas=tuple(HOJAS)):
+    """Devuelve los DataFrames de las hojas pedidas.
+
+    Al arrancar, cada hoja se toma de su instantánea en disco. Las que no
+    están en caché o quedaron obsoletas se ponen al día en una única
+    petición, que solo trae las filas nuevas salvo cuando toca leer la hoja
+    entera (ver `_fila_inicial`).
+
+    La petición se hace sin el candado del almacén: una lectura lenta o
+    frenada por la cuota no bloquea a las sesiones que sirven de la caché, y
+    las que piden lo mismo a la vez comparten la petición en la pasarela.
+    """
+    almacen = _almacen()
+    for _ in range(INTENTOS_SIN_CANDADO):
+        with almacen["lock"]:
+            for hoja in hojas:
+                if hoja not in almacen["cargas"]:
+                    carga = _leer_instantanea(hoja)
+                    if carga is not None:
+                        almacen["cargas"][hoja] = {**carga, "version": almacen["versiones"][hoja]}
+            pendientes = [hoja for hoja in hojas if not _vigente(almacen, hoja)]
+            if not pendientes or _arranque_en_segundo_plano(almacen, pendientes):
+                return {hoja: almacen["cargas"][hoja]["df"] for hoja in hojas}
+            estado = _estado_lectura(almacen, pendientes)
+        _leer_y_aplicar(almacen, estado)
+    # Si las escrituras siguen adelantándose a la lectura, se lee con el
+    # candado tomado para no quedarse sin datos
+    with almacen["lock"]:
+        pendientes = [hoja for hoja in hojas if not _vigente(almacen, hoja)]
+        escrituras = _poner_al_dia(almacen, pendientes) if pendientes else []
+        datos = {hoja: almacen["cargas"][hoja]["df"] for hoja in hojas}
+    _escribir_ids(almacen, escrituras)
+    return datos
+
+def _poner_al_dia(almacen, hojas):
+    # Con el candado del almacén tomado; devuelve los ids por escribir
+    desde = {hoja: _fila_inicial(almacen, hoja) for hoja in hojas}
+    leido = time.monotonic()
+    return _aplicar_lectura(almacen, desde, _leer_rangos(desde), leido)
+
+def _estado_lectura(almacen, hojas):
+    # Con el candado tomado: carga, versión y fila desde la que leer cada hoja
+    return {hoja: (almacen["cargas"].get(hoja), almacen["versiones"][hoja], _fila_inicial(almacen, hoja)) for hoja in hojas}
+
+def _leer_y_aplicar(almacen, estado):
+    """Lee sin el candado las hojas de `estado` y aplica la lectura a las que no cambiaron entretanto"""
+    desde = {hoja: fila for hoja, (_, _, fila) in estado.items()}
+    leido = time.monotonic()
+    lectura = _leer_rangos(desde)
+    with almacen["lock"]:
+        # Lo que se escribió entretanto se pondrá al día en la próxima carga
+        lectura = {
+            hoja: valores for hoja, valores in lectura.items()
+            if almacen["cargas"].get(hoja) is estado[hoja][0] and almacen["versiones"][hoja] == estado[hoja][1]
+        }
+        escrituras = _aplicar_lectura(almacen, desde, lectura, leido)
+    _escribir_ids(almacen, escrituras)
+
+def _aplicar_lectura(almacen, desde, lectura, leido):
+    # Con el candado tomado; devuelve los ids que faltan por escribir en la hoja
+    escrituras = []
+    for hoja, valores in lectura.items():
+        anterior = almacen["cargas"].get(hoja)
+        if desde[hoja] is None:
+            carga = _carga_completa(almacen, hoja, valores, escrituras)
+        else:
+            carga = _carga_incremental(almacen, hoja, valores, desde[hoja], escrituras)
+        almacen["cargas"][hoja] = {**carga, "leido": leido}
+        if anterior is None or carga["df"] is not anterior["df"] or carga["verificado"] != anterior["verificado"]:
+            _guardar_instantanea(hoja, almacen["cargas"][hoja])
+    return escrituras
+
+def _arranque_en_segundo_plano(almacen, hojas):
+    """Al arrancar con instantáneas, las pone al día en otro hilo y devuelve True.
+
+    Así la primera página se dibuja con los datos de disco sin esperar a
+    importar gspread, autorizar ni leer la hoja; cuando el hilo termina,
+    `_avisar_cambios` la vuelve a dibujar. Solo pasa una vez por proceso: si
+    la puesta al día falla, las siguientes cargas ya esperan a la hoja y
+    muestran el error.
+    """
+    if not ARRANQUE_RAPIDO or almacen.get("arranque") == "hecho":
+        return False
+    if any(almacen["cargas"].get(hoja, {}).get("leido") != float("-inf") for hoja in hojas):
+        return False
+    if almacen.get("arranque") is None:
+        almacen["arranque"] = "en curso"
+
+        def poner_al_dia():
+            try:
+                with almacen["lock"]:
+                    estado = _estado_lectura(
+                        almacen, [hoja for hoja in almacen["cargas"] if not _vigente(almacen, hoja)]
+                    )
+                if estado:
+                    _leer_y_aplicar(almacen, estado)
+            except Exception as e:
+                _registro.warning("No se pudieron poner al día las instantáneas al arrancar: %s", e)
+            finally:
+                almacen["arranque"] = "hecho"
+        threading.Thread(target=poner_al_dia, daemon=True, name="arranque-sheets").start()
+    return True
+
+def datos_provisionales():
+    """True mientras se muestran instantáneas que aún se están poniendo al día"""
+    return _almacen().get("arranque") == "en curso"
+
+def derivado(hoja, df, nombre, construir):
+    """Estructura calculada a partir de `df`, construida una vez por carga.
+
+    Se guarda junto a la carga de la hoja, así que todas las sesiones que
+    ven esa misma versión la comparten.
+    """
+    almacen = _almacen()
+    with almacen["lock"]:
+        carga = almacen["cargas"].get(hoja)
+        if carga is None or carga["df"] is not df:
+            return construir(df)
+        if nombre not in carga["derivados"]:
+            carga["derivados"][nombre] = construir(df)
+        return carga["derivados"][nombre]
+
+FIGURAS_MAXIMAS = 64  # figuras guardadas entre todas las sesiones
+
+# Las series largas se reducen antes de dibujarlas para que el tamaño de la
+# figura y lo que tarda el navegador no crezcan con el historial
+PUNTOS_POR_SERIE = 400    # puntos como mucho por línea
+ETIQUETAS_POR_SERIE = 12  # etiquetas de valor como mucho por línea
+MARCADORES_HASTA = 60     # con más puntos la línea va sin marcadores
+PUNTOS_WEBGL = 1000       # con más puntos en total se dibuja con WebGL
+
+def modo_dibujo(puntos):
+    """`render_mode` de Plotly para una figura de `puntos` puntos.
+
+    Solo lo necesitan las figuras de varias series: una sola ya reducida a
+    PUNTOS_POR_SERIE no llega nunca a PUNTOS_WEBGL.
+    """
+    return "webgl" if puntos > PUNTOS_WEBGL else "svg"
+
+@st.cache_resource
+def _figuras():
+    """Figuras ya construidas, de la usada hace más tiempo a la más reciente"""
+    return {"lock": threading.Lock(), "lru": OrderedDict(), "aciertos": 0, "fallos": 0}
+
+def figura(hoja, df, clave, construir):
+    """Figura de Plotly hecha a partir de `df`, reutilizada mientras no cambie.
+
+    Se guarda con la versión de la hoja y la `clave` (filtros y tipo de
+    gráfico), así que nunca queda obsoleta: las de versiones pasadas dejan de
+    pedirse y salen por el extremo menos usado. La figura es compartida y no
+    se modifica después de `construir()`.
+    """
+    almacen = _almacen()
+    with almacen["lock"]:
+        carga = almacen["cargas"].get(hoja)
+        version = carga["version"] if carga is not None and carga["df"] is df else None
+    if version is None:
+        return construir()
+    clave = (hoja, version, *clave)
+    cache = _figuras()
+    with cache["lock"]:
+        if clave in cache["lru"]:
+            cache["lru"].move_to_end(clave)
+            cache["aciertos"] += 1
+            return cache["lru"][clave]
+        cache["fallos"] += 1
+    with fase("figura"):
+        fig = construir()
+    with cache["lock"]:
+        cache["lru"][clave] = fig
+        while len(cache["lru"]) > FIGURAS_MAXIMAS:
+            cache["lru"].popitem(last=False)
+    return fig
+
+# === INSTANTÁNEAS EN DISCO ===
+# Copia en Parquet de cada hoja ya decodificada. Al arrancar se lee del
+# disco y de la API solo llegan las filas nuevas; cada INTERVALO_VERIFICACION
+# se relee la hoja entera y se compara su suma para detectar ediciones en
+# filas antiguas.
+
+RUTA_INSTANTANEAS = Path(os.environ.get("FINANZAS_INSTANTANEAS", Path(__file__).with_name("instantaneas")))
+INTERVALO_VERIFICACION = 3600  # segundos entre lecturas completas de cada hoja
+FORMATO_INSTANTANEA = 1        # se sube al cambiar cómo se decodifican las hojas
+# Con instantáneas en disco, la primera página no espera a Google Sheets
+# (ver `_arranque_en_segundo_plano`); FINANZAS_ARRANQUE_RAPIDO=0 lo desactiva
+ARRANQUE_RAPIDO = os.environ.get("FINANZAS_ARRANQUE_RAPIDO", "1") != "0"
+
+_registro = logging.getLogger(__name__)
+
+def _ruta_instantanea(hoja):
+    return RUTA_INSTANTANEAS / f"{hoja}.parquet"
+
+def _escribir_parquet(ruta, df, meta):
+    """Escribe `df` con `meta` en sus metadatos, sustituyendo el fichero anterior de golpe"""
+    # Las columnas de texto libre pueden mezclar números y texto
+    df = df.astype({columna: str for columna, tipo in df.dtypes.items() if tipo == object})
+    tabla = pa.Table.from_pandas(df, preserve_index=True)
+    tabla = tabla.replace_schema_metadata({**tabla.schema.metadata, b"finanzas": json.dumps(meta).encode()})
+    temporal = ruta.with_suffix(".tmp")
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    with fase("instantánea"):
+        pq.write_table(tabla, temporal)
+    os.replace(temporal, ruta)
+
+def _leer_parquet(ruta):
+    """`(df, meta)` de un fichero escrito con `_escribir_parquet`, o `None` si falta o es de otro formato"""
+    if not ruta.exists():
+        return None
+    with fase("instantánea"):
+        tabla = pq.read_table(ruta, memory_map=True)
+        meta = json.loads(tabla.schema.metadata[b"finanzas"])
+        if meta["formato"] != FORMATO_INSTANTANEA:
+            return None
+        return tabla.to_pandas(), meta
+
+ESPERA_INSTANTANEA = 1  # segundos que se agrupan los cambios de una hoja antes de escribirla
+
+class EscritorInstantaneas:
+    """Escribe las instantáneas en un hilo aparte, fuera del candado del almacén.
+
+    De cada hoja solo se escribe la última carga encargada, así que una
+    ráfaga de altas o los bloques de una importación acaban en una sola
+    escritura. Lo pendiente se escribe también al cerrar el proceso.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.escribiendo = threading.Lock()
+        self.pendientes = {}
+        self.aviso = threading.Event()
+        threading.Thread(target=self._bucle, daemon=True, name="instantaneas").start()
+        atexit.register(self.escribir)
+
+    def encargar(self, hoja, carga):
+        with self.lock:
+            self.pendientes[hoja] = carga
+        self.aviso.set()
+
+    def escribir(self):
+        """Escribe ya las cargas encargadas"""
+        with self.escribiendo:
+            with self.lock:
+                pendientes, self.pendientes = self.pendientes, {}
+            for hoja, carga in pendientes.items():
+                _escribir_instantanea(hoja, carga)
+
+    def _bucle(self):
+        while True:
+            self.aviso.wait()
+            time.sleep(ESPERA_INSTANTANEA)
+            self.aviso.clear()
+            self.escribir()
+
+@st.cache_resource
+def _escritor_instantaneas():
+    return EscritorInstantaneas()
+
+def _guardar_instantanea(hoja, carga):
+    """Encarga escribir la carga de una hoja en disco; no espera a que se escriba"""
+    _escritor_instantaneas().encargar(hoja, carga)
+
+def _escribir_instantanea(hoja, carga):
+    """Escribe la carga de una hoja en disco, sustituyendo la anterior de golpe"""
+    meta = {
+        "formato": FORMATO_INSTANTANEA,
+        "cabecera": carga["cabecera"],
+        "filas": carga["filas"],
+        "suma": carga["suma"],
+        "verificado": carga["verificado"],
+    }
+    try:
+        _escribir_parquet(_ruta_instantanea(hoja), carga["df"], meta)
+    except OSError as e:
+        _registro.warning("No se pudo guardar la instantánea de %s: %s", hoja, e)
+
+def _leer_instantanea(hoja):
+    """Carga guardada en disco para una hoja, o `None` si no hay una válida"""
+    try:
+        leido = _leer_parquet(_ruta_instantanea(hoja))
+    except Exception as e:
+        _registro.warning("Instantánea de %s ilegible, se descarta: %s", hoja, e)
+        return None
+    if leido is None:
+        return None
+    df, meta = leido
+    if hoja == "movimientos" and not df.empty:
+        df = df.astype(ESQUEMA_MOVIMIENTOS)
+    return {
+        "cabecera": meta["cabecera"],
+        "df": df,
+        "filas": meta["filas"],
+        "suma": meta["suma"],
+        "verificado": meta["verificado"],
+        # Aún sin contrastar con la hoja: la primera petición la pone al día
+        "leido": float("-inf"),
+        "derivados": {},
+    }
+
+# === DIARIO DE ESCRITURAS ===
+# Las altas se guardan primero en un diario local (SQLite) y la app sigue
+# sin esperar a Google Sheets. Un hilo en segundo plano las envía agrupadas,
+# una petición por hoja (o por lote de LOTE_ENVIO filas), y reintenta con
+# espera creciente si la API falla.
+
+RUTA_DIARIO = os.environ.get("FINANZAS_DIARIO", str(Path(__file__).with_name("diario_pendiente.sqlite3")))
+INTERVALO_SINCRONIZACION = 30  # segundos entre repasos del diario sin avisos
+ESPERA_AGRUPAR = 1             # segundos que se espera para juntar altas seguidas
+ESPERA_MAXIMA = 300            # tope de la espera entre reintentos
+LOTE_ENVIO = 2000              # filas por petición appendCells o updateCells, para no pasar el límite de tamaño
+
+def _a_json(valor):
+    if isinstance(valor, date):
+        return {"__fecha__": valor.isoformat()}
+    raise TypeError(f"No se puede guardar {type(valor).__name__} en el diario")
+
+def _de_json(objeto):
+    if "__fecha__" in objeto:
+        return date.fromisoformat(objeto["__fecha__"])
+    return objeto
+
+class Diario:
+    """Altas pendientes de escribir en Google Sheets, guardadas en disco"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        # Lo toma el envío mientras escribe en la hoja, para que nadie borre
+        # o edite a medias un registro que se está enviando
+        self.lock = threading.Lock()
+        self.aviso = threading.Event()
+        self.ultimo_error = None
+        with self._conectar() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS pendientes ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, hoja TEXT NOT NULL, id TEXT NOT NULL, "
+                "registro TEXT NOT NULL, intentos INTEGER NOT NULL DEFAULT 0)"
+            )
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta, timeout=30)
+
+    def agregar(self, hoja, registro):
+        self.agregar_varios(hoja, [registro])
+
+    def agregar_varios(self, hoja, registros):
+        """Guarda varias altas en una sola transacción"""
+        with self._conectar() as con:
+            con.executemany(
+                "INSERT INTO pendientes (hoja, id, registro) VALUES (?, ?, ?)",
+                [(hoja, registro["id"], json.dumps(registro, default=_a_json)) for registro in registros],
+            )
+        self.aviso.set()
+
+    def pendientes(self, hoja):
+        """Registros aún no escritos en la hoja, en el orden en que se dieron de alta"""
+        with self._conectar() as con:
+            filas = con.execute(
+                "SELECT seq, registro, intentos FROM pendientes WHERE hoja = ? ORDER BY seq", (hoja,)
+            ).fetchall()
+        return [(seq, json.loads(registro, object_hook=_de_json), intentos) for seq, registro, intentos in filas]
+
+    def contar(self):
+        with self._conectar() as con:
+            return con.execute("SELECT COUNT(*) FROM pendientes").fetchone()[0]
+
+    def quitar_id(self, hoja, id_registro):
+        """Descarta un alta pendiente; devuelve False si ya se había enviado"""
+        with self.lock, self._conectar() as con:
+            return con.execute("DELETE FROM pendientes WHERE hoja = ? AND id = ?", (hoja, id_registro)).rowcount > 0
+
+    def editar_id(self, hoja, id_registro, cambios):
+        """Aplica cambios a un alta pendiente; devuelve False si ya se había enviado"""
+        with self.lock, self._conectar() as con:
+            fila = con.execute(
+                "SELECT seq, registro FROM pendientes WHERE hoja = ? AND id = ?", (hoja, id_registro)
+            ).fetchone()
+            if fila is None:
+                return False
+            registro = {**json.loads(fila[1], object_hook=_de_json), **cambios}
+            con.execute(
+                "UPDATE pendientes SET registro = ? WHERE seq = ?",
+                (json.dumps(registro, default=_a_json), fila[0]),
+            )
+            return True
+
+    def enviar(self):
+        """Escribe todas las altas pendientes, una petición por hoja y lote.
+
+        Sin pendientes no hace nada: el repaso periódico no toca la hoja.
+        """
+        hojas = [hoja for hoja in HOJAS if self.pendientes(hoja)]
+        if not hojas:
+            return
+        cabeceras = {hoja: _cabecera(hoja) for hoja in hojas}
+        with self.lock:
+            for hoja in hojas:
+                pendientes = self.pendientes(hoja)
+                if not pendientes:
+                    continue
+                hoja_sheet = HojaCompartida(HOJAS[hoja])
+                cabecera = cabeceras[hoja]
+                seqs = [seq for seq, _, _ in pendientes]
+                registros = [registro for _, registro, _ in pendientes]
+                if any(intentos for _, _, intentos in pendientes):
+                    # Un intento fallido pudo llegar a escribir: no se repiten
+                    # los ids que ya están en la hoja
+                    escritos = set(map(str, hoja_sheet.col_values(cabecera.index("id") + 1)))
+                    registros = [registro for registro in registros if registro["id"] not in escritos]
+                enviados = set()
+                try:
+                    for inicio in range(0, len(registros), LOTE_ENVIO):
+                        lote = registros[inicio:inicio + LOTE_ENVIO]
+                        hoja_sheet.anexar_filas([[registro.get(c, "") for c in cabecera] for registro in lote])
+                        enviados.update(registro["id"] for registro in lote)
+                except Exception:
+                    # Los lotes ya escritos salen del diario; el resto se reintenta
+                    with self._conectar() as con:
+                        con.executemany(
+                            "DELETE FROM pendientes WHERE seq = ?",
+                            [(seq,) for seq, registro, _ in pendientes if registro["id"] in enviados],
+                        )
+                        con.executemany(
+                            "UPDATE pendientes SET intentos = intentos + 1 WHERE seq = ?",
+                            [(seq,) for seq, registro, _ in pendientes if registro["id"] not in enviados],
+                        )
+                    raise
+                with self._conectar() as con:
+                    con.executemany("DELETE FROM pendientes WHERE seq = ?", [(s,) for s in seqs])
+
+def _cabecera(hoja):
+    """Cabecera de una hoja: la de la carga en memoria, aunque ya no esté vigente, o la de una nueva"""
+    almacen = _almacen()
+    with almacen["lock"]:
+        carga = almacen["cargas"].get(hoja)
+    if carga is not None and carga["cabecera"]:
+        return carga["cabecera"]
+    return _carga(hoja)["cabecera"]
+
+def _sincronizar(diario):
+    espera = INTERVALO_SINCRONIZACION
+    while True:
+        if diario.aviso.wait(espera):
+            time.sleep(ESPERA_AGRUPAR)
+        diario.aviso.clear()
+        try:
+            diario.enviar()
+            diario.ultimo_error = None
+            espera = INTERVALO_SINCRONIZACION
+        except Exception as e:
+            diario.ultimo_error = str(e)
+            espera = min(ESPERA_MAXIMA, 2 if espera == INTERVALO_SINCRONIZACION else espera * 2)
+
+@st.cache_resource
+def _diario():
+    """Diario del proceso, con su hilo de envío ya arrancado"""
+    diario = Diario(RUTA_DIARIO)
+    threading.Thread(target=_sincronizar, args=(diario,), daemon=True, name="diario-sheets").start()
+    return diario
+
+def _con_pendientes(hoja, df, cabecera):
+    """Añade a los datos leídos de la hoja las altas que aún están en el diario"""
+    registros = [registro for _, registro, _ in _diario().pendientes(hoja) if registro["id"] not in df.index]
+    if not registros:
+        return df
+    fila = int(df["fila"].max()) + 1 if not df.empty else 2
+    return _unir(hoja, df, _decodificar_registros(hoja, cabecera, registros, fila))
+
+# === REGISTROS ===
+# Altas, bajas y ediciones por id. Antes de tocar una fila se comprueba que
+# en la hoja sigue estando el registro que se cargó, y después el cambio se
+# aplica sobre los datos en memoria en lugar de volver a descargar la hoja.
+
+class RegistroModificado(Exception):
+    """La fila de la hoja ya no coincide con el registro cargado"""
+
+def _carga(hoja):
+    cargar_hojas([hoja])
+    almacen = _almacen()
+    with almacen["lock"]:
+        return almacen["cargas"][hoja]
+
+def _valor_leido(valor):
+    """Valor tal como lo devuelve la lectura sin formato de Sheets"""
+    if valor is None or valor is pd.NaT or (isinstance(valor, float) and np.isnan(valor)):
+        return ""
+    if isinstance(valor, datetime):
+        valor = valor.date()
+    if isinstance(valor, date):
+        return (valor - EPOCA_SHEETS).days
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return valor
+
+def _decodificar_registro(hoja, cabecera, registro, fila):
+    """DataFrame de una sola fila con los mismos tipos que la carga completa"""
+    return _decodificar_registros(hoja, cabecera, [registro], fila)
+
+def _decodificar_registros(hoja, cabecera, registros, primera_fila):
+    """Varios registros seguidos desde `primera_fila`, decodificados de una vez"""
+    valores = [[_valor_leido(registro.get(columna, "")) for columna in cabecera] for registro in registros]
+    return DECODIFICADORES[hoja]([cabecera] + valores, primera_fila=primera_fila)
+
+def _unir(hoja, df, nuevo):
+    """Añade filas ya decodificadas manteniendo los tipos y el orden de la carga"""
+    if df.empty:
+        return nuevo
+    unido = pd.concat([df, nuevo]) if not nuevo.empty else df
+    for columna, tipo in df.dtypes.items():
+        if isinstance(tipo, pd.CategoricalDtype):
+            unido[columna] = unido[columna].astype("category")
+    orden = ["fecha", "fila"] if hoja == "movimientos" else ["fila"]
+    return unido.sort_values(orden, kind="stable", na_position="first")
+
+def _fila_en_memoria(hoja, id_registro):
+    """Fila que ocupa (u ocupará, si está pendiente) un registro según la carga"""
+    df = _carga(hoja)["df"]
+    if id_registro not in df.index:
+        raise RegistroModificado("ya no existe en la hoja.")
+    return int(df.at[id_registro, "fila"])
+
+def _mismo_valor(a, b):
+    """Compara un valor leído con el cargado: números por su valor y vacíos como iguales.
+
+    Una columna con huecos o decimales se carga como float y una sola fila
+    puede decodificarse como entero; 1000 y 1000.0 son el mismo registro.
+    """
+    if pd.isna(a) or pd.isna(b):
+        return pd.isna(a) and pd.isna(b)
+    if isinstance(a, (int, float, np.number)) and isinstance(b, (int, float, np.number)):
+        return float(a) == float(b)
+    return str(a) == str(b)
+
+def _fila_verificada(hoja, id_registro):
+    """Número de fila de un registro, tras comprobar que la hoja no cambió"""
+    carga = _carga(hoja)
+    df, cabecera = carga["df"], carga["cabecera"]
+    fila = _fila_en_memoria(hoja, id_registro)
+    valores = HojaCompartida(HOJAS[hoja]).leer_fila(fila)
+    actual = DECODIFICADORES[hoja]([cabecera, valores], primera_fila=fila)
+    columnas = [columna for columna in cabecera if columna in df.columns]
+    if (
+        id_registro not in actual.index
+        or not all(map(_mismo_valor, actual.loc[id_registro, columnas], df.loc[id_registro, columnas]))
+    ):
+        # Alguien cambió la hoja: se descarta la caché para ver su versión
+        invalidar(hoja)
+        raise RegistroModificado("la hoja cambió desde que se cargó; revisa los datos actualizados.")
+    return fila
+
+def _anexar(hoja, registro, ajuste_cubo=None, ajuste_saldo=None):
+    """Da de alta un registro: queda en el diario y se ve al momento en la app"""
+    _anexar_varios(hoja, [registro], ajuste_cubo=ajuste_cubo, ajuste_saldo=ajuste_saldo)
+
+def _anexar_varios(hoja, registros, ajuste_cubo=None, ajuste_saldo=None):
+    """Da de alta varios registros con una sola escritura en el diario y un solo parche"""
+    registros = [{**registro, "id": nuevo_id()} for registro in registros]
+    _diario().agregar_varios(hoja, registros)
+
+    def parche(df, cabecera):
+        fila = int(df["fila"].max()) + 1 if not df.empty else 2
+        return _unir(hoja, df, _decodificar_registros(hoja, cabecera, registros, fila))
+    invalidar(hoja, ajuste_cubo=ajuste_cubo, parche=parche, ajuste_saldo=ajuste_saldo)
+
+def _eliminar(hoja, id_registro, ajuste_cubo=None, ajuste_saldo=None):
+    """Borra la fila de un registro y corre las siguientes en memoria"""
+    fila = _fila_en_memoria(hoja, id_registro)
+    filas_hoja = 0
+    if not _diario().quitar_id(hoja, id_registro):
+        # No estaba pendiente: ya está en la hoja
+        fila = _fila_verificada(hoja, id_registro)
+        HojaCompartida(HOJAS[hoja]).delete_rows(fila)
+        filas_hoja = -1
+
+    def parche(df, cabecera):
+        df = df.drop(index=id_registro)
+        df["fila"] = df["fila"].where(df["fila"] < fila, df["fila"] - 1)
+        return df
+    invalidar(hoja, ajuste_cubo=ajuste_cubo, parche=parche, filas_hoja=filas_hoja, ajuste_saldo=ajuste_saldo)
+
+def _actualizar(hoja, id_registro, cambios, ajuste_saldo=None):
+    """Escribe los campos modificados de un registro"""
+    if not cambios:
+        return
+    cabecera = _carga(hoja)["cabecera"]
+    fila = _fila_en_memoria(hoja, id_registro)
+    if not _diario().editar_id(hoja, id_registro, cambios):
+        fila = _fila_verificada(hoja, id_registro)
+        HojaCompartida(HOJAS[hoja]).actualizar_celdas(
+            fila, {cabecera.index(campo): valor for campo, valor in cambios.items()}
+        )
+
+    def parche(df, cabecera):
+        registro = {columna: df.at[id_registro, columna] for columna in cabecera if columna in df.columns}
+        registro.update(cambios, id=id_registro)
+        return _unir(hoja, df.drop(index=id_registro), _decodificar_registro(hoja, cabecera, registro, fila))
+    invalidar(hoja, parche=parche, ajuste_saldo=ajuste_saldo)
+
+# === FUNCIONES ===
+
+def cargar_datos():
+    """Carga los datos desde Google Sheets (en caché hasta la próxima escritura)"""
+    return cargar_hojas(["movimientos"])["movimientos"]
+
 def cargar_ahorros():
     """Carga los datos de ahorros"""
     try:
-        data = sheet_ahorros.get_all_records()
-        df = pd.DataFrame(data)
-        if not df.empty:
-            df["fecha"] = pd.to_datetime(df["fecha"])
-        return df
+        return cargar_hojas(["ahorros"])["ahorros"]
     except Exception as e:
         st.error(f"Error al cargar ahorros: {str(e)}")
         return pd.DataFrame()
@@ -49,23 +1647,26 @@ def cargar_ahorros():
 def cargar_metas():
     """Carga las metas de ahorro"""
     try:
-        data = sheet_metas.get_all_records()
-        df = pd.DataFrame(data)
-        if not df.empty:
-            df["fecha_meta"] = pd.to_datetime(df["fecha_meta"])
-        return df
+        return cargar_hojas(["metas"])["metas"]
     except Exception as e:
         st.error(f"Error al cargar metas: {str(e)}")
         return pd.DataFrame()
 
+def cargar_todo():
+    """Carga movimientos, ahorros y metas con una sola lectura por lotes"""
+    try:
+        datos = cargar_hojas()
+    except Exception:
+        # Si la lectura conjunta falla, cada hoja se carga por separado
+        # con su propio manejo de errores
+        return cargar_datos(), cargar_ahorros(), cargar_metas()
+    return datos["movimientos"], datos["ahorros"], datos["metas"]
+
 def guardar_movimiento(fecha, nombre, importe, tipo):
     """Guarda un nuevo movimiento y retorna True si fue exitoso"""
     try:
-        fecha_str = fecha.strftime("%Y-%m-%d")
-        nueva_fila = [fecha_str, nombre, int(importe), tipo]
-        next_row = len(sheet.get_all_values()) + 1
-        sheet.append_row(nueva_fila)
-        sheet.format(f"A{next_row}", {"numberFormat": {"type": "DATE", "pattern": "yyyy-mm-dd"}})
+        registro = {"fecha": fecha, "nombre": nombre, "importe": int(importe), "tipo_movimiento": tipo}
+        _anexar("movimientos", registro, ajuste_cubo=(pd.Period(fecha, "M"), tipo, int(importe)))
         return True
     except Exception as e:
         st.error(f"Error al guardar el movimiento: {str(e)}")
@@ -74,11 +1675,10 @@ def guardar_movimiento(fecha, nombre, importe, tipo):
 def guardar_ahorro(fecha, monto, descripcion):
     """Guarda un nuevo movimiento de ahorro"""
     try:
-        fecha_str = fecha.strftime("%Y-%m-%d")
-        nueva_fila = [fecha_str, int(monto), descripcion]
-        next_row = len(sheet_ahorros.get_all_values()) + 1
-        sheet_ahorros.append_row(nueva_fila)
-        sheet_ahorros.format(f"A{next_row}", {"numberFormat": {"type": "DATE", "pattern": "yyyy-mm-dd"}})
+        _anexar(
+            "ahorros", {"fecha": fecha, "monto": int(monto), "descripcion": descripcion},
+            ajuste_saldo=[(fecha, int(monto), 1)],
+        )
         return True
     except Exception as e:
         st.error(f"Error al guardar el ahorro: {str(e)}")
@@ -87,99 +1687,619 @@ def guardar_ahorro(fecha, monto, descripcion):
 def guardar_meta(nombre, meta_total, fecha_meta, descripcion):
     """Guarda una nueva meta de ahorro"""
     try:
-        fecha_str = fecha_meta.strftime("%Y-%m-%d")
-        nueva_fila = [nombre, int(meta_total), fecha_str, descripcion]
-        next_row = len(sheet_metas.get_all_values()) + 1
-        sheet_metas.append_row(nueva_fila)
-        sheet_metas.format(f"C{next_row}", {"numberFormat": {"type": "DATE", "pattern": "yyyy-mm-dd"}})
+        registro = {"nombre_objetivo": nombre, "meta_total": int(meta_total), "fecha_meta": fecha_meta, "descripcion": descripcion}
+        _anexar("metas", registro)
         return True
     except Exception as e:
         st.error(f"Error al guardar la meta: {str(e)}")
         return False
 
-def eliminar_movimiento(indice_sheet):
+def eliminar_movimiento(id_movimiento):
     try:
-        sheet.delete_rows(indice_sheet + 2)  # +2 porque sheets empieza en 1 y tiene header
-        st.cache_data.clear()
+        registro = cargar_datos().loc[id_movimiento]
+        _eliminar("movimientos", id_movimiento, ajuste_cubo=(
+            registro["mes"], registro["tipo_movimiento"], -int(registro["importe"])
+        ))
         st.success("✅ Movimiento eliminado correctamente.")
         st.rerun()
+    except RegistroModificado as e:
+        st.error(f"No se eliminó el movimiento: {str(e)}")
     except Exception as e:
         st.error(f"Error al eliminar el movimiento: {str(e)}")
 
-def eliminar_ahorro(indice_sheet):
+def eliminar_ahorro(id_ahorro):
     try:
-        sheet_ahorros.delete_rows(indice_sheet + 2)
-        st.cache_data.clear()
+        registro = cargar_ahorros().loc[id_ahorro]
+        _eliminar("ahorros", id_ahorro, ajuste_saldo=[(registro["fecha"], registro["monto"], -1)])
         st.success("✅ Ahorro eliminado correctamente.")
         st.rerun()
+    except RegistroModificado as e:
+        st.error(f"No se eliminó el ahorro: {str(e)}")
     except Exception as e:
         st.error(f"Error al eliminar el ahorro: {str(e)}")
 
-def eliminar_meta(indice_sheet):
+def eliminar_meta(id_meta):
     try:
-        sheet_metas.delete_rows(indice_sheet + 2)
-        st.cache_data.clear()
+        _eliminar("metas", id_meta)
         st.success("✅ Meta eliminada correctamente.")
         st.rerun()
+    except RegistroModificado as e:
+        st.error(f"No se eliminó la meta: {str(e)}")
     except Exception as e:
         st.error(f"Error al eliminar la meta: {str(e)}")
 
-def actualizar_ahorro(indice_sheet, fecha, monto, descripcion):
-    """Actualiza un registro de ahorro existente"""
+def _cambios(nuevos, anterior=None):
+    """Campos cuyo valor difiere del registro cargado (todos si no se conoce)"""
+    if anterior is None:
+        return dict(nuevos)
+    cambios = {}
+    for campo, nuevo in nuevos.items():
+        viejo = anterior[campo]
+        if isinstance(viejo, pd.Timestamp):
+            viejo = viejo.date()
+        if nuevo != viejo:
+            cambios[campo] = nuevo
+    return cambios
+
+def actualizar_ahorro(id_ahorro, fecha, monto, descripcion, anterior=None):
+    """Actualiza un registro de ahorro existente, escribiendo solo los campos modificados"""
     try:
-        fecha_str = fecha.strftime("%Y-%m-%d")
-        sheet_ahorros.update(f'A{indice_sheet + 2}', fecha_str)
-        sheet_ahorros.update(f'B{indice_sheet + 2}', int(monto))
-        sheet_ahorros.update(f'C{indice_sheet + 2}', descripcion)
-        sheet_ahorros.format(f"A{indice_sheet + 2}", {"numberFormat": {"type": "DATE", "pattern": "yyyy-mm-dd"}})
+        cambios = _cambios({"fecha": fecha, "monto": int(monto), "descripcion": descripcion}, anterior)
+        ajuste_saldo = None
+        if "fecha" in cambios or "monto" in cambios:
+            registro = cargar_ahorros().loc[id_ahorro]
+            ajuste_saldo = [(registro["fecha"], registro["monto"], -1), (fecha, int(monto), 1)]
+        _actualizar("ahorros", id_ahorro, cambios, ajuste_saldo=ajuste_saldo)
         return True
+    except RegistroModificado as e:
+        st.error(f"No se actualizó el ahorro: {str(e)}")
+        return False
     except Exception as e:
         st.error(f"Error al actualizar el ahorro: {str(e)}")
         return False
 
-def actualizar_meta(indice_sheet, nombre, meta_total, fecha_meta, descripcion):
-    """Actualiza una meta existente"""
+def actualizar_meta(id_meta, nombre, meta_total, fecha_meta, descripcion, anterior=None):
+    """Actualiza una meta existente, escribiendo solo los campos modificados"""
     try:
-        fecha_str = fecha_meta.strftime("%Y-%m-%d")
-        sheet_metas.update(f'A{indice_sheet + 2}', nombre)
-        sheet_metas.update(f'B{indice_sheet + 2}', int(meta_total))
-        sheet_metas.update(f'C{indice_sheet + 2}', fecha_str)
-        sheet_metas.update(f'D{indice_sheet + 2}', descripcion)
-        sheet_metas.format(f"C{indice_sheet + 2}", {"numberFormat": {"type": "DATE", "pattern": "yyyy-mm-dd"}})
+        nuevos = {"nombre_objetivo": nombre, "meta_total": int(meta_total), "fecha_meta": fecha_meta, "descripcion": descripcion}
+        _actualizar("metas", id_meta, _cambios(nuevos, anterior))
         return True
+    except RegistroModificado as e:
+        st.error(f"No se actualizó la meta: {str(e)}")
+        return False
     except Exception as e:
         st.error(f"Error al actualizar la meta: {str(e)}")
         return False
 
+# === ARCHIVO POR AÑOS ===
+# Los años cerrados se pueden archivar: sus movimientos pasan de la hoja
+# principal a una hoja propia ("Archivo 2023") que ya no cambia, y sus
+# totales por mes y categoría a la hoja "Archivo resumen". Así la hoja que
+# se lee en cada carga no crece año tras año. Los gráficos y el detalle
+# mensual salen del resumen; las filas de un año archivado solo se leen
+# cuando se listan, y se guardan en disco porque ya no cambian.
+
+TITULO_ARCHIVO = "Archivo {}"
+TITULO_RESUMEN = "Archivo resumen"
+CABECERA_RESUMEN = ["mes", "tipo_movimiento", "importe"]
+# Ids con los que se crean las hojas del archivo, para poder escribir en
+# ellas en la misma petición que las crea
+ID_RESUMEN = 900_000_000
+BASE_ID_ARCHIVO = 910_000_000
+
+def id_archivo(año):
+    """Id de la hoja de archivo de `año`"""
+    return BASE_ID_ARCHIVO + año
+
+RUTA_ARCHIVO = RUTA_INSTANTANEAS / "archivo"
+
+def _ruta_archivo(nombre):
+    return RUTA_ARCHIVO / f"{nombre}.parquet"
+
+def _hojas_del_libro():
+    """Id de cada hoja del libro por su título, pedidos a la API"""
+    def operacion(conexion):
+        return {hoja.title: hoja.id for hoja in conexion["workbook"].worksheets()}
+    return _pasarela().llamar("worksheets", "lectura", operacion, clave=("worksheets",))
+
+def _leer_hojas(titulos):
+    """Contenido de varias hojas enteras, por su título, con una sola petición batchGet"""
+    def operacion(conexion):
+        respuesta = conexion["workbook"].values_batch_get([_rango_absoluto(titulo) for titulo in titulos], params=LECTURA)
+        return [rango.get("values", []) for rango in respuesta["valueRanges"]]
+    return _pasarela().llamar("batchGet", "lectura", operacion, clave=("batchGet", tuple(titulos)))
+
+def _decodificar_resumen(valores):
+    """Cubo mes × categoría a partir de las filas del resumen; las repetidas se suman"""
+    df = _columnas(valores, numericas=["importe"])
+    if df.empty:
+        return construir_cubo(df)
+    df["mes"] = pd.PeriodIndex(df["mes"].astype(str), freq="M")
+    df["importe"] = df["importe"].fillna(0).round().astype("int64")
+    return construir_cubo(df)
+
+def _leer_resumen_local():
+    try:
+        leido = _leer_parquet(_ruta_archivo("resumen"))
+    except Exception as e:
+        _registro.warning("Resumen del archivo ilegible, se descarta: %s", e)
+        return None
+    if leido is None:
+        return None
+    cubo, meta = leido
+    cubo.index = pd.PeriodIndex(cubo.index.astype(str), freq="M", name="mes")
+    return {"cubo": cubo.astype("int64"), "verificado": meta["verificado"]}
+
+def _guardar_resumen_local(resumen):
+    cubo = resumen["cubo"].copy()
+    cubo.index = cubo.index.astype(str)
+    try:
+        _escribir_parquet(
+            _ruta_archivo("resumen"), cubo, {"formato": FORMATO_INSTANTANEA, "verificado": resumen["verificado"]}
+        )
+    except OSError as e:
+        _registro.warning("No se pudo guardar el resumen del archivo: %s", e)
+
+def resumen_archivo():
+    """Cubo mes × categoría de los años archivados; vacío si no hay ninguno.
+
+    Se toma del disco y se vuelve a pedir a la hoja cuando la hoja principal
+    se ha leído entera después (ver `_fila_inicial`): archivar un año quita
+    sus filas de ella, así que es cuando se notaría que otro proceso archivó.
+    Mientras el arranque rápido muestra las instantáneas, basta con el de
+    disco. Si la hoja no responde se sigue con el último resumen conocido.
+    """
+    almacen = _almacen()
+    with almacen["lock"]:
+        resumen = almacen["archivo"]["resumen"]
+        carga = almacen["cargas"].get("movimientos")
+    verificado = carga["verificado"] if carga is not None else 0
+    if resumen is None:
+        resumen = _leer_resumen_local()
+    if resumen is None or (resumen["verificado"] < verificado and not datos_provisionales()):
+        try:
+            with fase("archivo"):
+                leido = time.time()
+                valores = _leer_hojas([TITULO_RESUMEN])[0] if TITULO_RESUMEN in _hojas_del_libro() else []
+                resumen = {"cubo": _decodificar_resumen(valores), "verificado": leido}
+            _guardar_resumen_local(resumen)
+        except Exception as e:
+            _registro.warning("No se pudo leer el resumen del archivo: %s", e)
+            if resumen is None:
+                return construir_cubo(pd.DataFrame())
+    with almacen["lock"]:
+        anterior = almacen["archivo"]["resumen"]
+        if anterior is None or not anterior["cubo"].equals(resumen["cubo"]):
+            almacen["archivo"]["version"] += 1
+        almacen["archivo"]["resumen"] = resumen
+    return resumen["cubo"]
+
+def version_archivo():
+    """Sube cada vez que cambia el resumen del archivo; va en la clave de las figuras que lo usan"""
+    almacen = _almacen()
+    with almacen["lock"]:
+        return almacen["archivo"]["version"]
+
+def cubo_total(df, resumen):
+    """Cubo de la hoja principal más el de los años archivados"""
+    cubo = cubo_mensual(df)
+    if resumen.empty:
+        return cubo
+    return cubo.add(resumen, fill_value=0).fillna(0).astype("int64").sort_index()
+
+def _particion(año):
+    """Entrada en memoria de un año archivado: de disco o, la primera vez, de su hoja"""
+    almacen = _almacen()
+    with almacen["lock"]:
+        particion = almacen["archivo"]["particiones"].get(año)
+    if particion is not None:
+        return particion
+    ruta = _ruta_archivo(f"movimientos-{año}")
+    try:
+        leido = _leer_parquet(ruta)
+    except Exception as e:
+        _registro.warning("Archivo de %s ilegible, se descarta: %s", año, e)
+        leido = None
+    if leido is not None:
+        df = leido[0]
+        df = df.astype(ESQUEMA_MOVIMIENTOS) if not df.empty else df
+    else:
+        with fase("archivo"):
+            df = _decodificar_movimientos(_leer_hojas([TITULO_ARCHIVO.format(año)])[0])
+        try:
+            _escribir_parquet(ruta, df, {"formato": FORMATO_INSTANTANEA})
+        except OSError as e:
+            _registro.warning("No se pudo guardar el archivo de %s: %s", año, e)
+    with almacen["lock"]:
+        return almacen["archivo"]["particiones"].setdefault(año, {"df": df, "huellas": None})
+
+def movimientos_del_año(df, indice, año, resumen):
+    """Movimientos de un año: los de la hoja principal y, si está archivado, los de su hoja"""
+    vivos = indice.rebanada(df, año)
+    if año not in resumen.index.year:
+        return vivos
+    return _unir("movimientos", _particion(año)["df"], vivos)
+
+def huellas_archivadas(año):
+    """Índice de huellas (ver `IndiceHuellas`) de un año archivado, construido una vez"""
+    particion = _particion(año)
+    almacen = _almacen()
+    with almacen["lock"]:
+        if particion["huellas"] is None:
+            particion["huellas"] = IndiceHuellas(particion["df"])
+        return particion["huellas"]
+
+def _filas_para_archivo(df, cabecera):
+    """Valores de cada movimiento en el orden de `cabecera`, listos para `_celda`"""
+    df = df.reset_index()
+    columnas = []
+    for columna in cabecera:
+        if columna == "fecha":
+            columnas.append([fecha.date() if not pd.isna(fecha) else "" for fecha in df["fecha"]])
+        elif columna in df:
+            columnas.append(df[columna].astype(object).where(df[columna].notna(), "").tolist())
+        else:
+            columnas.append([""] * len(df))
+    return [list(fila) for fila in zip(*columnas)]
+
+def _tramos(filas):
+    """Tramos `(primera, última)` de filas consecutivas, del último al primero"""
+    filas = np.sort(np.asarray(filas))
+    cortes = np.flatnonzero(np.diff(filas) != 1) + 1
+    return [(int(tramo[0]), int(tramo[-1])) for tramo in np.split(filas, cortes)][::-1]
+
+def _anexar_celdas(id_hoja, filas):
+    return {"appendCells": {
+        "sheetId": id_hoja,
+        "rows": [{"values": [_celda(v) for v in valores]} for valores in filas],
+        "fields": "userEnteredValue,userEnteredFormat.numberFormat",
+    }}
+
+def _filas_por_id(hoja, cabecera, ids):
+    """Fila que ocupa ahora en la hoja cada uno de `ids`, según su columna `id` recién leída"""
+    columna = HojaCompartida(HOJAS[hoja]).col_values(cabecera.index("id") + 1)
+    posiciones = {str(valor): fila for fila, valor in enumerate(columna, start=1)}
+    if not all(str(id_registro) in posiciones for id_registro in ids):
+        invalidar(hoja)
+        raise RegistroModificado("la hoja cambió desde que se cargó; revisa los datos actualizados.")
+    return [posiciones[str(id_registro)] for id_registro in ids]
+
+def archivar_año(año):
+    """Pasa los movimientos de un año cerrado de la hoja principal a su hoja de archivo.
+
+    Las filas se copian a "Archivo {año}", sus totales se añaden al resumen
+    y se borran de la hoja principal, todo en una sola petición batchUpdate,
+    que Sheets aplica entera o no aplica. Si el año ya estaba archivado (se
+    añadieron movimientos con fecha antigua), se completa su hoja. Las altas
+    aún pendientes en el diario se quedan en la hoja principal.
+
+    Devuelve cuántos movimientos se archivaron, o None si hubo un error.
+    """
+    try:
+        if año >= date.today().year:
+            st.error("Solo se pueden archivar años ya cerrados.")
+            return None
+        if datos_provisionales():
+            st.error("Espera a que terminen de cargarse los datos de Google Sheets.")
+            return None
+        # Se parte de la hoja recién leída entera, para borrar las filas que tocan
+        invalidar("movimientos")
+        carga = _carga("movimientos")
+        df, cabecera = carga["df"], carga["cabecera"]
+        df_año = IndiceFechas(df).rebanada(df, año)
+        df_año = df_año[df_año["fila"] <= carga["filas"]]
+        if df_año.empty:
+            st.error(f"No hay movimientos de {año} en la hoja principal.")
+            return None
+
+        hojas = _hojas_del_libro()
+        titulo = TITULO_ARCHIVO.format(año)
+        filas_archivo = _filas_para_archivo(df_año, cabecera)
+        sumas = df_año.groupby(["mes", "tipo_movimiento"], observed=True)["importe"].sum()
+        filas_resumen = [[str(mes), tipo, int(importe)] for (mes, tipo), importe in sumas.items()]
+        requests = []
+        if titulo not in hojas:
+            hojas[titulo] = id_archivo(año)
+            requests.append({"addSheet": {"properties": {"sheetId": hojas[titulo], "title": titulo}}})
+            filas_archivo = [cabecera] + filas_archivo
+        if TITULO_RESUMEN not in hojas:
+            hojas[TITULO_RESUMEN] = ID_RESUMEN
+            requests.append({"addSheet": {"properties": {"sheetId": ID_RESUMEN, "title": TITULO_RESUMEN}}})
+            filas_resumen = [CABECERA_RESUMEN] + filas_resumen
+        requests.append(_anexar_celdas(hojas[titulo], filas_archivo))
+        requests.append(_anexar_celdas(hojas[TITULO_RESUMEN], filas_resumen))
+
+        try:
+            # Como en los demás borrados, no se fía de la fila en memoria: otra
+            # sesión pudo borrar filas desde la lectura, y las de cada id se
+            # vuelven a mirar en la hoja. El envío del diario espera mientras.
+            with _diario().lock:
+                filas = _filas_por_id("movimientos", cabecera, df_año.index)
+
+                def operacion(conexion):
+                    id_principal = conexion["hojas"][HOJAS["movimientos"]].id
+                    # Del último tramo al primero, para que los borrados no muevan los que faltan
+                    borrados = [{"deleteDimension": {"range": {
+                        "sheetId": id_principal, "dimension": "ROWS", "startIndex": primera - 1, "endIndex": ultima,
+                    }}} for primera, ultima in _tramos(filas)]
+                    return conexion["workbook"].batch_update({"requests": requests + borrados})
+                with fase("archivo"):
+                    _pasarela().llamar("archivar", "escritura", operacion)
+        finally:
+            # Aunque falle, la petición pudo aplicarse: se vuelve a leer todo
+            # de la hoja, y un nuevo intento parte de lo que haya en ella
+            _olvidar_archivo(año)
+    except Exception as e:
+        st.error(f"Error al archivar {año}: {str(e)}")
+        return None
+    return len(df_año)
+
+def _olvidar_archivo(año):
+    """Descarta lo guardado de la hoja principal y del archivo de `año` tras escribir en ellos"""
+    almacen = _almacen()
+    with almacen["lock"]:
+        almacen["archivo"]["resumen"] = None
+        almacen["archivo"]["particiones"].pop(año, None)
+    for nombre in ["resumen", f"movimientos-{año}"]:
+        _ruta_archivo(nombre).unlink(missing_ok=True)
+    invalidar("movimientos")
+
+# === IMPORTACIÓN DE EXTRACTOS ===
+# Los extractos del banco (CSV) se leen por bloques: cada bloque se
+# convierte en movimientos, se quitan los que ya están en el ledger y el
+# resto se da de alta de una vez. La memoria no crece con el tamaño del
+# fichero y el diario los envía a la hoja en lotes de LOTE_ENVIO filas.
+
+LINEAS_POR_BLOQUE = 2000
+SEGUN_SIGNO = "(según el signo del importe)"
+
+# Nombres con que suelen venir las columnas en los extractos, ya normalizados
+COLUMNAS_PROBABLES = {
+    "fecha": ["fecha", "date"],
+    "nombre": ["nombre", "descripcion", "concepto", "detalle", "referencia"],
+    "importe": ["importe", "monto", "amount", "valor"],
+    "tipo_movimiento": ["tipo_movimiento", "categoria", "tipo"],
+}
+
+def _leer_csv(archivo, **kwargs):
+    # Separador (`,` o `;`) detectado por el motor de Python; todo como texto
+    archivo.seek(0)
+    return pd.read_csv(
+        archivo, sep=None, engine="python", dtype=str, keep_default_na=False,
+        encoding="utf-8-sig", encoding_errors="replace", **kwargs,
+    )
+
+def columnas_csv(archivo):
+    """Nombres de las columnas de un CSV"""
+    return list(_leer_csv(archivo, nrows=0).columns)
+
+def columna_probable(columnas, campo):
+    """Posición de la columna del CSV que más probablemente corresponde a `campo`.
+
+    Gana el nombre idéntico a un candidato, luego el que lo tiene como
+    palabra y por último como parte de una; a igualdad, el candidato que va
+    antes en COLUMNAS_PROBABLES. Las columnas con una palabra de fecha
+    ("Fecha valor") solo se proponen para la fecha.
+    """
+    nombres = [nombre.as_py() for nombre in _normalizar(columnas)]
+    palabras = [set(re.findall(r"[a-z0-9]+", nombre)) for nombre in nombres]
+    posibles = [
+        i for i in range(len(nombres))
+        if campo == "fecha" or not palabras[i] & set(COLUMNAS_PROBABLES["fecha"])
+    ]
+    criterios = [
+        lambda candidato, i: nombres[i] == candidato,
+        lambda candidato, i: candidato in palabras[i],
+        lambda candidato, i: candidato in nombres[i],
+    ]
+    for criterio in criterios:
+        for candidato in COLUMNAS_PROBABLES[campo]:
+            for i in posibles:
+                if criterio(candidato, i):
+                    return i
+    return None
+
+def _importes(textos, decimal=","):
+    """Importes tal como vienen en el extracto ("$ 1.234,50", "-45.000") a números"""
+    miles = "." if decimal == "," else ","
+    textos = (
+        textos.str.replace(r"[^0-9,.\-]", "", regex=True)
+        .str.replace(miles, "", regex=False)
+        .str.replace(decimal, ".", regex=False)
+    )
+    return pd.to_numeric(textos, errors="coerce")
+
+def _fechas_csv(textos, dia_primero):
+    """Fechas del extracto; las ISO (2024-12-31) se leen siempre con el año primero"""
+    textos = textos.str.strip()
+    iso = textos.str.match(r"\d{4}-")
+    fechas = pd.to_datetime(textos.where(~iso), dayfirst=dia_primero, errors="coerce", format="mixed")
+    return fechas.mask(iso, pd.to_datetime(textos.where(iso), errors="coerce", format="mixed"))
+
+def _movimientos_csv(bloque, mapeo, categoria, decimal, dia_primero):
+    """Movimientos de un bloque del CSV; se descartan las líneas sin fecha, nombre o importe"""
+    importes = _importes(bloque[mapeo["importe"]], decimal)
+    if mapeo["tipo_movimiento"] == SEGUN_SIGNO:
+        tipos = pd.Series(np.where(importes > 0, "Ingresos", categoria), index=bloque.index)
+    else:
+        tipos = bloque[mapeo["tipo_movimiento"]].str.strip().replace("", categoria)
+    movimientos = pd.DataFrame({
+        "fecha": _fechas_csv(bloque[mapeo["fecha"]], dia_primero),
+        "nombre": bloque[mapeo["nombre"]].str.split().str.join(" "),
+        "importe": importes.abs().round(),
+        "tipo_movimiento": tipos,
+    })
+    movimientos = movimientos.dropna(subset=["fecha", "importe"])
+    movimientos = movimientos[movimientos["nombre"] != ""]
+    return movimientos.astype({"importe": "int64"})
+
+def huellas_movimientos(df):
+    """Huella del contenido de cada movimiento: día, nombre normalizado e importe.
+
+    El tipo no entra: el extracto del banco no trae la categoría que el
+    usuario le puso a mano, solo la que se deduce del signo.
+    """
+    claves = pd.DataFrame({
+        "fecha": pd.to_datetime(df["fecha"]).dt.normalize().astype("datetime64[ns]").to_numpy(),
+        "nombre": pc.utf8_trim_whitespace(_normalizar(df["nombre"])).to_numpy(zero_copy_only=False),
+        "importe": df["importe"].astype("int64").to_numpy(),
+    })
+    return pd.util.hash_pandas_object(claves, index=False).to_numpy()
+
+class IndiceHuellas:
+    """Cuántas veces está cada movimiento del ledger, por su huella"""
+
+    def __init__(self, df):
+        huellas = huellas_movimientos(df) if not df.empty else np.array([], dtype="uint64")
+        self.huellas, self.veces = np.unique(huellas, return_counts=True)
+
+    def contar(self, huellas):
+        """Veces que ya está en el ledger cada una de `huellas`"""
+        if not len(self.huellas):
+            return np.zeros(len(huellas), dtype="int64")
+        posiciones = np.minimum(np.searchsorted(self.huellas, huellas), len(self.huellas) - 1)
+        return np.where(self.huellas[posiciones] == huellas, self.veces[posiciones], 0)
+
+def indice_huellas(df):
+    """Índice de huellas del ledger, compartido mientras no cambien los datos"""
+    return derivado("movimientos", df, "huellas", IndiceHuellas)
+
+def importar_movimientos(archivo, mapeo, categoria, decimal=",", dia_primero=True):
+    """Da de alta los movimientos de un extracto CSV sin repetir los que ya están.
+
+    `mapeo` relaciona `fecha`, `nombre`, `importe` y `tipo_movimiento` con
+    columnas del CSV. Con `tipo_movimiento` igual a SEGUN_SIGNO, los importes
+    positivos son Ingresos y los negativos van a `categoria`, que también se
+    usa cuando la celda del tipo está vacía.
+
+    Un movimiento está repetido si el ledger, años archivados incluidos, ya
+    tiene otro con el mismo día, nombre e importe, aunque se le diera otro
+    tipo al apuntarlo a mano. Se cuentan las veces: si el extracto trae dos
+    iguales (dos cafés el mismo día) y el ledger solo uno, entra el segundo.
+    Devuelve cuántas líneas se importaron, cuántas estaban repetidas y
+    cuántas no se pudieron leer, o None si hubo un error.
+    """
+    resultado = {"importados": 0, "repetidos": 0, "descartados": 0}
+    try:
+        indice = indice_huellas(cargar_datos())
+        archivados = set(resumen_archivo().index.year)
+        vistas = {}  # veces que ha salido cada huella en los bloques anteriores
+        columnas = list(dict.fromkeys(columna for columna in mapeo.values() if columna != SEGUN_SIGNO))
+        for bloque in _leer_csv(archivo, usecols=columnas, chunksize=LINEAS_POR_BLOQUE):
+            movimientos = _movimientos_csv(bloque, mapeo, categoria, decimal, dia_primero)
+            resultado["descartados"] += len(bloque) - len(movimientos)
+            if movimientos.empty:
+                continue
+            huellas = huellas_movimientos(movimientos)
+            # La n-ésima aparición en el extracto es nueva si el ledger tiene menos de n
+            previas = pd.Series(huellas).map(vistas).fillna(0).to_numpy()
+            aparicion = pd.Series(huellas).groupby(huellas).cumcount().to_numpy() + previas
+            ya_estan = indice.contar(huellas)
+            años = movimientos["fecha"].dt.year.to_numpy()
+            for año in archivados.intersection(años):
+                del_año = años == año
+                ya_estan[del_año] += huellas_archivadas(año).contar(huellas[del_año])
+            nuevos = movimientos[aparicion >= ya_estan]
+            for huella, veces in zip(*np.unique(huellas, return_counts=True)):
+                vistas[huella] = vistas.get(huella, 0) + veces
+            resultado["repetidos"] += len(movimientos) - len(nuevos)
+            if nuevos.empty:
+                continue
+            sumas = nuevos.groupby([nuevos["fecha"].dt.to_period("M"), "tipo_movimiento"])["importe"].sum()
+            _anexar_varios(
+                "movimientos",
+                [
+                    {"fecha": fecha.date(), "nombre": nombre, "importe": int(importe), "tipo_movimiento": tipo}
+                    for fecha, nombre, importe, tipo in nuevos.itertuples(index=False)
+                ],
+                ajuste_cubo=[(mes, tipo, int(importe)) for (mes, tipo), importe in sumas.items()],
+            )
+            resultado["importados"] += len(nuevos)
+        return resultado
+    except Exception as e:
+        st.error(
+            f"Error al importar el extracto tras {resultado['importados']} movimientos: {str(e)}. "
+            "Si lo vuelves a importar, los que ya entraron no se repetirán."
+        )
+        return None
+
+iniciar_traza()
+iniciar_perfil()
+
+# El título sale antes de cargar nada para que la página aparezca cuanto antes
+st.title("Finanzas Personales")
+
 # Cargar datos al inicio
-df = cargar_datos()
-df_ahorros = cargar_ahorros()
-df_metas = cargar_metas()
+with fase("carga de datos"):
+    df, df_ahorros, df_metas = cargar_todo()
+# Versiones con las que se dibuja esta ejecución; ver `_avisar_cambios`
+st.session_state["versiones_vistas"] = versiones_vigentes()
+st.session_state["datos_provisionales"] = datos_provisionales()
 
-fmt = lambda x: f"${x:,.0f}".replace(",", ".")
+POR_PAGINA = 20  # filas por página en las listas largas
 
 # === INTERFAZ PRINCIPAL ===
 
-st.title("Finanzas Personales")
+if st.session_state["datos_provisionales"]:
+    st.caption("⏳ Mostrando los datos guardados mientras se actualizan desde Google Sheets")
+
+diario = _diario()
+pendientes_diario = diario.contar()
+if pendientes_diario:
+    st.caption(f"⏳ {pendientes_diario} registro(s) pendientes de guardar en Google Sheets")
+    if diario.ultimo_error:
+        st.warning(f"No se pudo sincronizar con Google Sheets, se reintentará: {diario.ultimo_error}")
+
+INTERVALO_AVISO = 15  # segundos entre comprobaciones de cambios hechos en otras sesiones
+
+@st.fragment(run_every=INTERVALO_AVISO)
+def _avisar_cambios():
+    """Vuelve a dibujar la página cuando los datos compartidos cambian.
+
+    Los datos son los mismos para todas las sesiones; cuando otra sesión
+    escribe, o la sincronización trae cambios de la hoja, sube la versión y
+    esta sesión se vuelve a ejecutar sin esperar a que el usuario toque nada.
+    Lo mismo cuando termina la puesta al día de las instantáneas del arranque.
+    """
+    try:
+        # Sin coste mientras las hojas sigan vigentes
+        cargar_hojas()
+    except Exception:
+        return
+    if versiones_vigentes() != st.session_state.get("versiones_vistas") or (
+        st.session_state.get("datos_provisionales") and not datos_provisionales()
+    ):
+        st.rerun(scope="app")
+
+_avisar_cambios()
 
 # === FILTROS PRINCIPALES ===
-col1, col2, col3 = st.columns([1, 1, 2])
-with col1:
-    año = st.selectbox("Selecciona un año", sorted(df["fecha"].dt.year.unique()), index=0)
-    df_filtrado = df[df["fecha"].dt.year == año]
-
-with col2:    
-    meses = ["Todos"] + sorted(df_filtrado["mes"].unique().tolist())
-    mes_seleccionado = st.selectbox("Selecciona un mes", meses, index=0)
+with fase("filtros"):
+    col1, col2, col3 = st.columns([1, 1, 2])
+    indice = indice_fechas(df)
+    # Los años archivados están en el resumen aunque ya no tengan filas en la hoja
+    resumen = resumen_archivo()
+    with col1:
+        año = st.selectbox("Selecciona un año", sorted(set(indice.años()) | set(resumen.index.year)), index=0)
+        df_filtrado = indice.rebanada(df, año)
+
+    with col2:    
+        meses = ["Todos"] + sorted(set(indice.meses(año)) | set(resumen.index[resumen.index.year == año]))
+        mes_seleccionado = st.selectbox("Selecciona un mes", meses, index=0)
     
-    if mes_seleccionado != "Todos":
-        df_filtrado = df_filtrado[df_filtrado["mes"] == mes_seleccionado]
+        if mes_seleccionado != "Todos":
+            df_filtrado = indice.rebanada(df, mes=mes_seleccionado)
+
+    cubo = cubo_total(df, resumen)
+    cubo_periodo = periodo_cubo(cubo, año, mes_seleccionado)
 
 # Inicializar estados de sesión
 if "mostrar_formulario" not in st.session_state:
     st.session_state["mostrar_formulario"] = False
 if "mostrar_eliminar" not in st.session_state:
     st.session_state["mostrar_eliminar"] = False
+if "mostrar_importar" not in st.session_state:
+    st.session_state["mostrar_importar"] = False
 if "confirmar_eliminar" not in st.session_state:
     st.session_state["confirmar_eliminar"] = False
 if "indice_eliminar" not in st.session_state:
@@ -197,87 +2317,61 @@ if "confirmar_eliminar_ahorro" not in st.session_state:
 if "confirmar_eliminar_meta" not in st.session_state:
     st.session_state["confirmar_eliminar_meta"] = None
 
-# Crear pestañas
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
-    "📊 Resumen Gráfico",
-    "📝 Gestión de Movimientos",
-    "📋 Detalle Mensual",
-    "📜 Lista de Movimientos",
-    "💰 Ahorros y Metas"
-])
+# Un registro en edición puede haber desaparecido (borrado en otra sesión)
+if st.session_state["editar_ahorro"] not in df_ahorros.index:
+    st.session_state["editar_ahorro"] = None
+if st.session_state["editar_meta"] not in df_metas.index:
+    st.session_state["editar_meta"] = None
 
-with tab1:
-    # === RESUMEN GRÁFICO ===
-    st.subheader("Resumen General")
-    gastos_filtrados = df_filtrado[df_filtrado["tipo_movimiento"] != "Ingresos"]
-    ingresos_filtrados = df_filtrado[df_filtrado["tipo_movimiento"] == "Ingresos"]
+# === PESTAÑAS ===
+# Cada pestaña solo se ejecuta mientras está abierta. Las que tienen
+# controles propios van en fragmentos: tocar un control vuelve a ejecutar su
+# fragmento y no la página entera. Lo que cambia los datos sí relanza la
+# página, porque afecta a todas las pestañas.
 
-    total_gastos = gastos_filtrados["importe"].sum()
-    total_ingresos = ingresos_filtrados["importe"].sum()
-    balance = total_ingresos - total_gastos
+def relanzar_fragmento():
+    """Vuelve a dibujar solo el fragmento en curso tras cambiar su estado.
 
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Total Ingresos", fmt(total_ingresos))
-    col2.metric("Total Gastos", fmt(total_gastos))
-    col3.metric("Balance Neto", fmt(balance))
-
-    # Gráficos de categorías
-    st.subheader("Distribución de gastos por categoría")
-    cat_summary = gastos_filtrados.groupby("tipo_movimiento")["importe"].sum().reset_index()
-    cat_summary["porcentaje"] = 100 * cat_summary["importe"] / cat_summary["importe"].sum()
-    cat_summary["importe_fmt"] = cat_summary["importe"].apply(fmt)
-
-    # Definir colores específicos para cada categoría
-    COLOR_MAP = {
-        "Alimentacion": "#63B3ED",     # Azul claro
-        "Transporte": "#38B2AC",       # Verde turquesa
-        "Compras": "#F56565",          # Rojo
-        "Gastos fijos": "#FBD38D",     # Rosa salmón
-        "Ahorro": "#2B6CB0",           # Azul oscuro
-        "Salidas": "#48BB78",          # Verde
-        "Otros": "#D6BCFA"             # Morado claro
-    }
+    Si el fragmento se está ejecutando dentro de una ejecución completa de
+    la página, Streamlit no admite el alcance de fragmento y se relanza todo.
+    """
+    try:
+        st.rerun(scope="fragment")
+    except st.errors.StreamlitAPIException:
+        st.rerun()
 
-    col1, col2 = st.columns(2)
-    # Gráfico de torta
-    fig1 = px.pie(cat_summary, names="tipo_movimiento", values="porcentaje", 
-                title="Distribución por categoría",
-                color="tipo_movimiento",
-                color_discrete_map=COLOR_MAP)
-    fig1.update_traces(textinfo="percent")
-
-    # Gráfico de barras horizontales
-    cat_summary_sorted = cat_summary.sort_values("importe", ascending=False)
-    fig2 = px.bar(cat_summary_sorted, y="tipo_movimiento", x="importe", text="importe_fmt",
-                title="Gastos absolutos", orientation='h',
-                color="tipo_movimiento",
-                color_discrete_map=COLOR_MAP)
-    fig2.update_layout(showlegend=False)
-
-    col1.plotly_chart(fig1, use_container_width=True)
-    col2.plotly_chart(fig2, use_container_width=True)
-
-    # Evolución mensual
-    st.subheader("Evolución mensual de gastos")
-    evol = df[df["tipo_movimiento"] != "Ingresos"].groupby(["mes", "tipo_movimiento"])["importe"].sum().reset_index()
-    fig_line = px.line(evol, x="mes", y="importe", color="tipo_movimiento", markers=True,
-                      color_discrete_map=COLOR_MAP)
-    fig_line.update_layout(yaxis_tickformat=",", yaxis_tickprefix="$ ")
-    st.plotly_chart(fig_line, use_container_width=True)
-
-with tab2:
-    # === GESTIÓN DE MOVIMIENTOS ===
+@st.fragment
+def gestion_movimientos(df):
+    """Alta y baja de movimientos"""
     st.subheader("Gestión de Movimientos")
     
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         if st.button("➕ Añadir Nuevo Movimiento"):
             st.session_state["mostrar_formulario"] = True
             st.session_state["mostrar_eliminar"] = False
+            st.session_state["mostrar_importar"] = False
     with col2:
         if st.button("➖ Eliminar Movimiento"):
             st.session_state["mostrar_eliminar"] = True
             st.session_state["mostrar_formulario"] = False
+            st.session_state["mostrar_importar"] = False
+    with col3:
+        if st.button("📥 Importar Extracto CSV"):
+            st.session_state["mostrar_importar"] = True
+            st.session_state["mostrar_formulario"] = False
+            st.session_state["mostrar_eliminar"] = False
+
+    resultado = st.session_state.pop("resultado_importacion", None)
+    if resultado:
+        st.success(
+            f"{resultado['importados']} movimientos importados · {resultado['repetidos']} ya estaban "
+            f"· {resultado['descartados']} líneas sin fecha, nombre o importe."
+        )
+
+    archivado = st.session_state.pop("resultado_archivo", None)
+    if archivado:
+        st.success(f"{archivado[1]} movimientos de {archivado[0]} archivados.")
 
     # Formulario para añadir
     if st.session_state["mostrar_formulario"]:
@@ -298,17 +2392,64 @@ with tab2:
                     df = cargar_datos()
                     st.rerun()
 
+    # Importación de extractos del banco
+    if st.session_state["mostrar_importar"]:
+        st.markdown("### 📥 Importar Extracto")
+        archivo = st.file_uploader("Extracto del banco (CSV)", type=["csv", "txt"])
+        columnas = None
+        if archivo is not None:
+            try:
+                columnas = columnas_csv(archivo)
+            except Exception as e:
+                st.error(f"No se pudo leer el CSV: {str(e)}")
+        if columnas:
+            with st.form("importar"):
+                col1, col2 = st.columns(2)
+                mapeo = {}
+                with col1:
+                    for campo in ["fecha", "nombre", "importe"]:
+                        mapeo[campo] = st.selectbox(
+                            f"Columna de {campo}", columnas, index=columna_probable(columnas, campo) or 0
+                        )
+                    decimal = st.radio("Separador decimal del importe", [",", "."], horizontal=True)
+                with col2:
+                    probable = columna_probable(columnas, "tipo_movimiento")
+                    mapeo["tipo_movimiento"] = st.selectbox(
+                        "Columna del tipo de movimiento", [SEGUN_SIGNO] + columnas,
+                        index=0 if probable is None else probable + 1,
+                    )
+                    categoria = st.selectbox(
+                        "Tipo para los gastos sin tipo", sorted(df["tipo_movimiento"].unique()) + ["Otro"]
+                    )
+                    dia_primero = st.checkbox("Fechas con el día primero (31/12/2024)", value=True)
+
+                if st.form_submit_button("Importar"):
+                    with fase("importación"):
+                        resultado = importar_movimientos(archivo, mapeo, categoria, decimal, dia_primero)
+                    if resultado is not None:
+                        st.session_state["resultado_importacion"] = resultado
+                        st.session_state["mostrar_importar"] = False
+                        st.rerun()
+
     # Interfaz para eliminar
     if st.session_state["mostrar_eliminar"]:
         st.markdown("### 🗑️ Eliminar Movimiento")
-        busqueda = st.text_input("🔍 Buscar movimiento por nombre", "")
+        busqueda = st.text_input(
+            "🔍 Buscar movimiento por nombre", "",
+            on_change=lambda: st.session_state.update(pagina_eliminar=1)
+        )
         
-        df_eliminar = df.copy()
-        df_eliminar["fecha"] = df_eliminar["fecha"].dt.strftime("%Y-%m-%d")
-        df_eliminar["importe"] = df_eliminar["importe"].apply(fmt)
+        # Más recientes primero; solo se formatea y se pinta la página visible
+        posiciones = indice_busqueda(df).buscar(busqueda)[::-1]
+        total_paginas = max(1, -(-len(posiciones) // POR_PAGINA))
+        if st.session_state.get("pagina_eliminar", 1) > total_paginas:
+            st.session_state["pagina_eliminar"] = total_paginas
+        pagina = st.number_input("Página", min_value=1, max_value=total_paginas, step=1, key="pagina_eliminar")
+        st.caption(f"{len(posiciones)} movimientos · página {pagina} de {total_paginas}")
         
-        if busqueda:
-            df_eliminar = df_eliminar[df_eliminar["nombre"].str.contains(busqueda, case=False)]
+        df_eliminar = df.iloc[posiciones[(pagina - 1) * POR_PAGINA:pagina * POR_PAGINA]].copy()
+        df_eliminar["fecha"] = df_eliminar["fecha"].dt.strftime("%Y-%m-%d")
+        df_eliminar["importe"] = fmt_columna(df_eliminar["importe"])
         
         for idx, row in df_eliminar.iterrows():
             if st.session_state["confirmar_eliminar"] and st.session_state["indice_eliminar"] == idx:
@@ -324,7 +2465,7 @@ with tab2:
                     if st.button("✗ No", key=f"cancel_{idx}"):
                         st.session_state["confirmar_eliminar"] = False
                         st.session_state["indice_eliminar"] = None
-                        st.rerun()
+                        relanzar_fragmento()
             else:
                 cols = st.columns([2, 3, 2, 2, 1])
                 cols[0].write(row["fecha"])
@@ -334,29 +2475,32 @@ with tab2:
                 if cols[4].button("🗑️", key=f"del_{idx}"):
                     st.session_state["confirmar_eliminar"] = True
                     st.session_state["indice_eliminar"] = idx
-                    st.rerun()
+                    relanzar_fragmento()
             st.markdown("---")
         
         if st.button("Cerrar"):
             st.session_state["mostrar_eliminar"] = False
-            st.rerun()
+            relanzar_fragmento()
 
-with tab3:
-    # === DETALLE MENSUAL ===
-    st.subheader("Detalle por mes y categoría")
-    
-    # Crear pivot table incluyendo ingresos
-    pivot = df_filtrado.groupby(["mes", "tipo_movimiento"])["importe"].sum().unstack(fill_value=0)
-    # Reordenar columnas para que Ingresos sea la primera
-    columnas = ["Ingresos"] + [col for col in pivot.columns if col != "Ingresos"]
-    pivot = pivot[columnas]
-    # Añadir columna de Total (Ingresos - Gastos)
-    gastos_totales = pivot.drop("Ingresos", axis=1).sum(axis=1)
-    pivot["Total"] = pivot["Ingresos"] - gastos_totales
-    st.dataframe(pivot.style.format(fmt))
-
-with tab4:
-    # === LISTA DE MOVIMIENTOS ===
+    # Archivo de años cerrados
+    cerrados = [año for año in indice_fechas(df).años() if año < date.today().year]
+    if cerrados:
+        with st.expander("🗄️ Archivar años cerrados"):
+            st.caption(
+                "Los movimientos del año pasan a su propia hoja y dejan de leerse en cada carga. "
+                "Se siguen viendo en los gráficos y en la lista, pero ya no se pueden eliminar desde aquí."
+            )
+            año_archivar = st.selectbox("Año", cerrados, key="año_archivar")
+            if st.button(f"Archivar {año_archivar}"):
+                with st.spinner(f"Archivando {año_archivar}..."):
+                    archivados = archivar_año(año_archivar)
+                if archivados is not None:
+                    st.session_state["resultado_archivo"] = (año_archivar, archivados)
+                    st.rerun()
+
+@st.fragment
+def lista_movimientos(df, df_filtrado, indice, meses, mes_seleccionado):
+    """Tabla de movimientos con sus propios filtros"""
     st.subheader("Lista de Movimientos")
     
     col1, col2 = st.columns(2)
@@ -368,18 +2512,19 @@ with tab4:
     with col2:
         mes_filtro = st.multiselect(
             "Filtrar por mes",
-            options=sorted(df_filtrado["mes"].unique().tolist())
+            options=meses[1:] if mes_seleccionado == "Todos" else [mes_seleccionado]
         )
 
-    df_detalle = df_filtrado.copy()
+    df_detalle = df_filtrado
+    if mes_filtro:
+        df_detalle = pd.concat([indice.rebanada(df, mes=mes) for mes in sorted(mes_filtro)])
     if categoria_filtro:
         df_detalle = df_detalle[df_detalle["tipo_movimiento"].isin(categoria_filtro)]
-    if mes_filtro:
-        df_detalle = df_detalle[df_detalle["mes"].isin(mes_filtro)]
 
-    df_detalle = df_detalle.sort_values("fecha", ascending=False)
+    # Ya viene ordenado por fecha: basta invertirlo
+    df_detalle = df_detalle.iloc[::-1].copy()
     df_detalle["fecha"] = df_detalle["fecha"].dt.strftime("%Y-%m-%d")
-    df_detalle["importe"] = df_detalle["importe"].apply(fmt)
+    df_detalle["importe"] = fmt_columna(df_detalle["importe"])
 
     st.dataframe(
         df_detalle[["fecha", "nombre", "importe", "tipo_movimiento"]],
@@ -392,10 +2537,9 @@ with tab4:
         hide_index=True
     )
 
-with tab5:
-    # === AHORROS Y METAS ===
-    st.subheader("💰 Gestión de Ahorros y Metas")
-    
+@st.fragment
+def seccion_ahorros(df_ahorros, saldo):
+    """Registro, edición y lista de ahorros"""
     # Sección de Ahorros
     st.markdown("### 📈 Ahorros")
     
@@ -410,7 +2554,7 @@ with tab5:
         with st.form("formulario_ahorro"):
             editar_modo = st.session_state["editar_ahorro"] is not None
             if editar_modo:
-                ahorro = df_ahorros.iloc[st.session_state["editar_ahorro"]]
+                ahorro = df_ahorros.loc[st.session_state["editar_ahorro"]]
                 st.markdown("#### ✏️ Editar Ahorro")
             else:
                 st.markdown("#### ➕ Nuevo Ahorro")
@@ -441,7 +2585,7 @@ with tab5:
             
             if submit:
                 if editar_modo:
-                    if actualizar_ahorro(st.session_state["editar_ahorro"], fecha_ahorro, monto_ahorro, descripcion_ahorro):
+                    if actualizar_ahorro(st.session_state["editar_ahorro"], fecha_ahorro, monto_ahorro, descripcion_ahorro, anterior=ahorro):
                         st.success("✅ Ahorro actualizado correctamente")
                         st.session_state["editar_ahorro"] = None
                         df_ahorros = cargar_ahorros()
@@ -456,37 +2600,39 @@ with tab5:
             if cancel:
                 st.session_state["mostrar_form_ahorro"] = False
                 st.session_state["editar_ahorro"] = None
-                st.rerun()
+                relanzar_fragmento()
     
     # Mostrar resumen de ahorros
     if not df_ahorros.empty:
-        total_ahorrado = df_ahorros["monto"].sum()
-        st.metric("Total Ahorrado", fmt(total_ahorrado))
-        
-        # Gráfico de evolución de ahorros
-        df_ahorros_evol = df_ahorros.sort_values("fecha").copy()
-        df_ahorros_evol["monto_acumulado"] = df_ahorros_evol["monto"].cumsum()
+        st.metric("Total Ahorrado", fmt(saldo.total))
         
-        fig_ahorros = px.line(
-            df_ahorros_evol,
-            x="fecha",
-            y="monto_acumulado",
-            title="Evolución de Ahorros (Acumulado)",
-            markers=True
-        )
-        fig_ahorros.update_layout(
-            yaxis_tickformat=",",
-            yaxis_tickprefix="$ ",
-            xaxis_title="Fecha",
-            yaxis_title="Total Ahorrado"
-        )
-        
-        # Añadir etiquetas con los montos en cada punto
-        fig_ahorros.update_traces(
-            texttemplate="%{y:$,.0f}",
-            textposition="top center"
-        )
+        # Gráfico de evolución de ahorros, sobre el saldo ya acumulado
+        def evolucion_ahorros():
+            px = importar("plotly.express")
+            serie = pd.DataFrame({"fecha": saldo.fechas, "monto_acumulado": saldo.acumulado})
+            serie = reducir_series(serie, "fecha", "monto_acumulado", PUNTOS_POR_SERIE)
+            # Etiquetas con los montos en unos pocos puntos repartidos, siempre en el último
+            serie = serie.assign(etiqueta=np.where(
+                espaciadas(len(serie), ETIQUETAS_POR_SERIE), fmt_columna(serie["monto_acumulado"]), ""
+            ))
+            fig = px.line(
+                serie,
+                x="fecha",
+                y="monto_acumulado",
+                text="etiqueta",
+                title="Evolución de Ahorros (Acumulado)",
+                markers=len(serie) <= MARCADORES_HASTA,
+            )
+            fig.update_layout(
+                yaxis_tickformat=",",
+                yaxis_tickprefix="$ ",
+                xaxis_title="Fecha",
+                yaxis_title="Total Ahorrado"
+            )
+            fig.update_traces(textposition="top center")
+            return fig
         
+        fig_ahorros = figura("ahorros", df_ahorros, ("evolucion",), evolucion_ahorros)
         st.plotly_chart(fig_ahorros, use_container_width=True)
         
         # Lista de movimientos de ahorro
@@ -502,26 +2648,29 @@ with tab5:
                 if cols[3].button("✏️", key=f"edit_ahorro_{idx}"):
                     st.session_state["editar_ahorro"] = idx
                     st.session_state["mostrar_form_ahorro"] = False
-                    st.rerun()
+                    relanzar_fragmento()
                 
                 if cols[4].button("🗑️", key=f"del_ahorro_{idx}"):
                     st.session_state["confirmar_eliminar_ahorro"] = idx
-                    st.rerun()
+                    relanzar_fragmento()
                 
                 # Confirmación de eliminación
                 if st.session_state["confirmar_eliminar_ahorro"] == idx:
                     st.warning("⚠️ ¿Estás seguro de eliminar este ahorro?")
                     col1, col2 = st.columns(2)
                     if col1.button("✓ Sí", key=f"confirm_del_ahorro_{idx}"):
+                        # Si se elimina, la función ya relanza la app; si no, se
+                        # queda el mensaje de error a la vista
                         eliminar_ahorro(idx)
                         st.session_state["confirmar_eliminar_ahorro"] = None
-                        df_ahorros = cargar_ahorros()
-                        st.rerun()
                     if col2.button("✗ No", key=f"cancel_del_ahorro_{idx}"):
                         st.session_state["confirmar_eliminar_ahorro"] = None
-                        st.rerun()
+                        relanzar_fragmento()
                 st.markdown("---")
-    
+
+@st.fragment
+def seccion_metas(df_metas, saldo):
+    """Registro, edición y progreso de las metas"""
     # Sección de Metas
     st.markdown("### 🎯 Metas de Ahorro")
     
@@ -536,7 +2685,7 @@ with tab5:
         with st.form("formulario_meta"):
             editar_modo = st.session_state["editar_meta"] is not None
             if editar_modo:
-                meta = df_metas.iloc[st.session_state["editar_meta"]]
+                meta = df_metas.loc[st.session_state["editar_meta"]]
                 st.markdown("#### ✏️ Editar Meta")
             else:
                 st.markdown("#### ➕ Nueva Meta")
@@ -571,7 +2720,7 @@ with tab5:
             
             if submit:
                 if editar_modo:
-                    if actualizar_meta(st.session_state["editar_meta"], nombre_meta, meta_total, fecha_meta, descripcion_meta):
+                    if actualizar_meta(st.session_state["editar_meta"], nombre_meta, meta_total, fecha_meta, descripcion_meta, anterior=meta):
                         st.success("✅ Meta actualizada correctamente")
                         st.session_state["editar_meta"] = None
                         df_metas = cargar_metas()
@@ -586,11 +2735,16 @@ with tab5:
             if cancel:
                 st.session_state["mostrar_form_meta"] = False
                 st.session_state["editar_meta"] = None
-                st.rerun()
+                relanzar_fragmento()
     
     # Mostrar metas existentes
     if not df_metas.empty:
         st.markdown("#### Metas Actuales")
+        st.caption(
+            f"Ritmo de ahorro de los últimos {VENTANA_RITMO} días: "
+            f"{fmt(saldo.ritmo_diario(pd.Timestamp.today().normalize()) * 30)} al mes"
+        )
+        evaluacion = evaluar_metas(df_metas, saldo)
         for idx, meta in df_metas.iterrows():
             with st.container():
                 col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 1, 1])
@@ -601,33 +2755,226 @@ with tab5:
                     st.metric("Objetivo", fmt(meta['meta_total']))
                     st.write(f"Fecha: {meta['fecha_meta'].strftime('%Y-%m-%d')}")
                 with col3:
-                    # Calcular progreso basado en ahorros totales
-                    progreso = min(100, (total_ahorrado / meta['meta_total']) * 100)
-                    st.progress(progreso / 100)
-                    st.write(f"Progreso: {progreso:.1f}%")
+                    # Progreso basado en ahorros totales
+                    estado = evaluacion.loc[idx]
+                    st.progress(estado["progreso"] / 100)
+                    st.write(f"Progreso: {estado['progreso']:.1f}%")
+                    if estado["faltante"] == 0:
+                        st.caption("🎉 Meta alcanzada")
+                    elif pd.isna(estado["fecha_prevista"]):
+                        st.caption("Al ritmo actual no hay fecha prevista")
+                    else:
+                        st.caption(
+                            f"Al ritmo actual: {estado['fecha_prevista'].strftime('%Y-%m-%d')} "
+                            + ("✅ a tiempo" if estado["a_tiempo"] else "⚠️ después de la fecha")
+                        )
                 
                 # Botones de editar y eliminar
                 with col4:
                     if st.button("✏️", key=f"edit_meta_{idx}"):
                         st.session_state["editar_meta"] = idx
                         st.session_state["mostrar_form_meta"] = False
-                        st.rerun()
+                        relanzar_fragmento()
                 
                 with col5:
                     if st.button("🗑️", key=f"del_meta_{idx}"):
                         st.session_state["confirmar_eliminar_meta"] = idx
-                        st.rerun()
+                        relanzar_fragmento()
                 
                 # Confirmación de eliminación
                 if st.session_state["confirmar_eliminar_meta"] == idx:
                     st.warning("⚠️ ¿Estás seguro de eliminar esta meta?")
                     col1, col2 = st.columns(2)
                     if col1.button("✓ Sí", key=f"confirm_del_meta_{idx}"):
+                        # Si se elimina, la función ya relanza la app; si no, se
+                        # queda el mensaje de error a la vista
                         eliminar_meta(idx)
                         st.session_state["confirmar_eliminar_meta"] = None
-                        df_metas = cargar_metas()
-                        st.rerun()
                     if col2.button("✗ No", key=f"cancel_del_meta_{idx}"):
                         st.session_state["confirmar_eliminar_meta"] = None
-                        st.rerun()
+                        relanzar_fragmento()
                 st.markdown("---")
+
+# Crear pestañas
+tab1, tab2, tab3, tab4, tab5 = st.tabs([
+    "📊 Resumen Gráfico",
+    "📝 Gestión de Movimientos",
+    "📋 Detalle Mensual",
+    "📜 Lista de Movimientos",
+    "💰 Ahorros y Metas"
+], key="pestaña", on_change="rerun")
+
+with tab1, fase("resumen"):
+    # === RESUMEN GRÁFICO ===
+    if tab1.open:
+        st.subheader("Resumen General")
+        if año is None:
+            st.info("Aún no hay movimientos: añade el primero en la pestaña de gestión.")
+        gastos_por_categoria = cubo_periodo.drop(columns="Ingresos", errors="ignore").sum()
+
+        total_gastos = gastos_por_categoria.sum()
+        total_ingresos = cubo_periodo["Ingresos"].sum() if "Ingresos" in cubo_periodo else 0
+        balance = total_ingresos - total_gastos
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Total Ingresos", fmt(total_ingresos))
+        col2.metric("Total Gastos", fmt(total_gastos))
+        col3.metric("Balance Neto", fmt(balance))
+
+        # Gráficos de categorías
+        st.subheader("Distribución de gastos por categoría")
+        cat_summary = gastos_por_categoria.rename_axis("tipo_movimiento").reset_index(name="importe")
+        cat_summary["porcentaje"] = 100 * cat_summary["importe"] / cat_summary["importe"].sum()
+        cat_summary["importe_fmt"] = fmt_columna(cat_summary["importe"])
+
+        # Definir colores específicos para cada categoría
+        COLOR_MAP = {
+            "Alimentacion": "#63B3ED",     # Azul claro
+            "Transporte": "#38B2AC",       # Verde turquesa
+            "Compras": "#F56565",          # Rojo
+            "Gastos fijos": "#FBD38D",     # Rosa salmón
+            "Ahorro": "#2B6CB0",           # Azul oscuro
+            "Salidas": "#48BB78",          # Verde
+            "Otros": "#D6BCFA"             # Morado claro
+        }
+
+        col1, col2 = st.columns(2)
+        # Gráfico de torta
+        def torta():
+            px = importar("plotly.express")
+            fig = px.pie(cat_summary, names="tipo_movimiento", values="porcentaje", 
+                        title="Distribución por categoría",
+                        color="tipo_movimiento",
+                        color_discrete_map=COLOR_MAP)
+            fig.update_traces(textinfo="percent")
+            return fig
+
+        # Gráfico de barras horizontales
+        def barras():
+            px = importar("plotly.express")
+            cat_summary_sorted = cat_summary.sort_values("importe", ascending=False)
+            fig = px.bar(cat_summary_sorted, y="tipo_movimiento", x="importe", text="importe_fmt",
+                        title="Gastos absolutos", orientation='h',
+                        color="tipo_movimiento",
+                        color_discrete_map=COLOR_MAP)
+            fig.update_layout(showlegend=False)
+            return fig
+
+        # Las figuras salen del cubo con los años archivados: su clave lleva
+        # también la versión del resumen
+        archivo = version_archivo()
+        fig1 = figura("movimientos", df, (archivo, año, mes_seleccionado, "torta"), torta)
+        fig2 = figura("movimientos", df, (archivo, año, mes_seleccionado, "barras"), barras)
+        col1.plotly_chart(fig1, use_container_width=True)
+        col2.plotly_chart(fig2, use_container_width=True)
+
+        # Evolución mensual
+        st.subheader("Evolución mensual de gastos")
+        def evolucion():
+            px = importar("plotly.express")
+            evol = cubo.drop(columns="Ingresos", errors="ignore").stack()
+            evol = evol[evol != 0].rename_axis(["mes", "tipo_movimiento"]).reset_index(name="importe")
+            evol["orden"] = pd.PeriodIndex(evol["mes"]).asi8
+            evol = reducir_series(evol, "orden", "importe", PUNTOS_POR_SERIE, color="tipo_movimiento")
+            evol["mes"] = evol["mes"].astype(str)
+            # Cada categoría puede quedarse con meses distintos: el eje sigue el calendario
+            meses_eje = sorted(evol["mes"].unique())
+            fig = px.line(evol, x="mes", y="importe", color="tipo_movimiento",
+                          markers=len(meses_eje) <= MARCADORES_HASTA,
+                          render_mode=modo_dibujo(len(evol)),
+                          category_orders={"mes": meses_eje},
+                          color_discrete_map=COLOR_MAP)
+            fig.update_layout(yaxis_tickformat=",", yaxis_tickprefix="$ ")
+            return fig
+
+        fig_line = figura("movimientos", df, (archivo, "evolucion"), evolucion)
+        st.plotly_chart(fig_line, use_container_width=True)
+
+with tab2, fase("gestión"):
+    # === GESTIÓN DE MOVIMIENTOS ===
+    if tab2.open:
+        gestion_movimientos(df)
+
+with tab3, fase("detalle mensual"):
+    # === DETALLE MENSUAL ===
+    if tab3.open:
+        st.subheader("Detalle por mes y categoría")
+    
+        # Crear pivot table incluyendo ingresos
+        pivot = cubo_periodo.copy()
+        pivot.index = pivot.index.astype(str)
+        # Reordenar columnas para que Ingresos sea la primera; a cero si el
+        # periodo no tiene ingresos o aún no hay movimientos
+        columnas = ["Ingresos"] + [col for col in pivot.columns if col != "Ingresos"]
+        pivot = pivot.reindex(columns=columnas, fill_value=0)
+        # Añadir columna de Total (Ingresos - Gastos)
+        gastos_totales = pivot.drop("Ingresos", axis=1).sum(axis=1)
+        pivot["Total"] = pivot["Ingresos"] - gastos_totales
+        st.dataframe(pivot.style.format(fmt))
+
+with tab4, fase("lista"):
+    # === LISTA DE MOVIMIENTOS ===
+    if tab4.open:
+        if año in resumen.index.year:
+            # Solo aquí hacen falta las filas de un año archivado
+            df_año = movimientos_del_año(df, indice, año, resumen)
+            indice_año = IndiceFechas(df_año)
+            df_filtrado = indice_año.rebanada(
+                df_año, año, mes=mes_seleccionado if mes_seleccionado != "Todos" else None
+            )
+            lista_movimientos(df_año, df_filtrado, indice_año, meses, mes_seleccionado)
+        else:
+            lista_movimientos(df, df_filtrado, indice, meses, mes_seleccionado)
+
+with tab5, fase("ahorros y metas"):
+    # === AHORROS Y METAS ===
+    if tab5.open:
+        st.subheader("💰 Gestión de Ahorros y Metas")
+        saldo = saldo_ahorros(df_ahorros)
+        seccion_ahorros(df_ahorros, saldo)
+        seccion_metas(df_metas, saldo)
+
+# === DIAGNÓSTICO ===
+# Panel opcional para seguir el consumo de la app; donde DIAGNOSTICO lo
+# permite, se activa abriendo la página con ?diagnostico=1
+
+terminar_perfil()
+
+if DIAGNOSTICO and st.query_params.get("diagnostico") == "1":
+    with st.expander("🩺 Diagnóstico"), fase("diagnóstico"):
+        st.markdown("#### Últimas ejecuciones (ms por fase)")
+        trazas = list(st.session_state.get("trazas", []))
+        if trazas:
+            st.dataframe(resumen_trazas(trazas), hide_index=True)
+            if trazas[-1]["llamadas"]:
+                st.caption("Llamadas a la API de la última ejecución")
+                st.dataframe(pd.DataFrame(trazas[-1]["llamadas"]), hide_index=True)
+        if "perfil" in st.session_state:
+            st.markdown("#### Perfil de la última ejecución perfilada")
+            st.code(st.session_state["perfil"], language=None)
+        else:
+            st.caption("Añade &perfil=1 a la dirección para perfilar una ejecución con cProfile.")
+        st.markdown("#### Memoria de los datos cargados")
+        col1, col2, col3 = st.columns(3)
+        for col, titulo, datos in [(col1, "Movimientos", df), (col2, "Ahorros", df_ahorros), (col3, "Metas", df_metas)]:
+            col.markdown(f"**{titulo}** ({len(datos)} filas)")
+            col.dataframe(reporte_memoria(datos))
+        st.markdown("#### Llamadas a la API de Google Sheets")
+        st.dataframe(_pasarela().resumen())
+        st.markdown("#### Importaciones diferidas")
+        importaciones = _importaciones()
+        if importaciones:
+            st.dataframe(pd.DataFrame({
+                "módulo": list(importaciones),
+                "ms": [round(segundos * 1000, 1) for segundos in importaciones.values()],
+            }), hide_index=True)
+        else:
+            st.caption("Aún no se ha importado ninguno en este proceso.")
+        figuras = _figuras()
+        st.markdown("#### Caché de figuras")
+        st.write(
+            f"{len(figuras['lru'])} de {FIGURAS_MAXIMAS} guardadas · "
+            f"{figuras['aciertos']} aciertos · {figuras['fallos']} construidas"
+        )
+
+terminar_traza()
@@ -0,0 +1,143 @@
+"""Tiempos de la app completa sobre un libro local de datos sintéticos.
+
+Uso: python benchmarks/bench_app.py [--filas 1000 10000 100000] [--latencia-ms 0] [--json salida.json]
+
+Para cada tamaño genera un libro con `datos_sinteticos`, ejecuta app.py con
+el AppTest de Streamlit contra él y mide las fases de una sesión típica.
+Los tiempos incluyen el coste de ejecutar el script entero, que es lo que
+espera el usuario en cada interacción. Cada tamaño se mide en un proceso
+nuevo que antes hace una sesión sobre un libro pequeño, para que todos
+partan igual: "carga en frío" es con los datos fríos, no con las
+importaciones de la primera ejecución.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from datos_sinteticos import generar  # noqa: E402
+
+PESTAÑA_RESUMEN = "📊 Resumen Gráfico"
+PESTAÑA_GESTION = "📝 Gestión de Movimientos"
+PESTAÑA_DETALLE = "📋 Detalle Mensual"
+REPETICIONES = 5
+FILAS_CALENTAMIENTO = 100
+ESPERA_ESCRITOR = 2  # segundos; más que ESPERA_INSTANTANEA en app.py
+
+def _ejecutar(at, pestaña=PESTAÑA_RESUMEN, accion=None):
+    """Segundos de una ejecución del script; `accion(at)` prepara los widgets antes"""
+    # AppTest no recuerda la pestaña abierta entre ejecuciones
+    at.session_state["pestaña"] = pestaña
+    if accion is not None:
+        accion(at)
+    inicio = time.perf_counter()
+    at.run()
+    segundos = time.perf_counter() - inicio
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return segundos
+
+def _segundos_figuras(at):
+    """Segundos que la última ejecución pasó construyendo figuras, según su traza"""
+    fases = at.session_state["trazas"][-1]["fases"]
+    return sum(ms for nombre, ms in fases.items() if nombre.endswith("figura")) / 1000
+
+def _mediana(at, repeticiones=REPETICIONES, **kwargs):
+    return statistics.median(_ejecutar(at, **kwargs) for _ in range(repeticiones))
+
+def _nueva_sesion():
+    return AppTest.from_file(str(RAIZ / "app.py"), default_timeout=600)
+
+def medir(filas, latencia_ms=0):
+    """Tiempos (ms) de cada fase para un libro de `filas` movimientos"""
+    with tempfile.TemporaryDirectory() as carpeta:
+        carpeta = Path(carpeta)
+        generar(str(carpeta / "libro.sqlite3"), filas)
+        os.environ.update({
+            "FINANZAS_LIBRO_LOCAL": str(carpeta / "libro.sqlite3"),
+            "FINANZAS_LATENCIA_MS": str(latencia_ms),
+            "FINANZAS_DIARIO": str(carpeta / "diario.sqlite3"),
+            "FINANZAS_INSTANTANEAS": str(carpeta / "instantaneas"),
+        })
+        st.cache_resource.clear()
+        st.cache_data.clear()
+
+        tiempos = {}
+        frias = []
+        for _ in range(REPETICIONES):
+            # Sin caché ni instantáneas, como un proceso recién arrancado. Al
+            # final se espera a que el escritor de instantáneas termine, para
+            # que no escriba durante la siguiente
+            st.cache_resource.clear()
+            shutil.rmtree(carpeta / "instantaneas", ignore_errors=True)
+            at = _nueva_sesion()
+            frias.append(_ejecutar(at))
+            time.sleep(ESPERA_ESCRITOR)
+        tiempos["carga en frío"] = statistics.median(frias)
+        tiempos["rerun en caliente"] = _mediana(at)
+
+        # Proceso nuevo con la instantánea ya en disco
+        st.cache_resource.clear()
+        tiempos["arranque con instantánea"] = _ejecutar(_nueva_sesion())
+
+        at = _nueva_sesion()
+        _ejecutar(at)
+        meses = at.selectbox[1].options[1:REPETICIONES + 1]
+        filtros, graficos = [], []
+        for mes in meses:
+            # La primera vez que se ve un mes se construyen sus gráficos; la
+            # fase "figura" de la traza mide solo esa construcción
+            filtros.append(_ejecutar(at, accion=lambda at, mes=mes: at.selectbox[1].select(mes)))
+            graficos.append(_segundos_figuras(at))
+        tiempos["filtro por mes"] = statistics.median(filtros)
+        tiempos["gráficos (construcción)"] = statistics.median(graficos)
+        tiempos["pivote (detalle mensual)"] = _mediana(at, pestaña=PESTAÑA_DETALLE)
+
+        def alta(at):
+            at.text_input[0].set_value("benchmark")
+            at.number_input[0].set_value(12000)
+            next(boton for boton in at.button if boton.label == "Agregar").click()
+        _ejecutar(at, pestaña=PESTAÑA_GESTION)
+        _ejecutar(at, pestaña=PESTAÑA_GESTION, accion=lambda at: next(
+            boton for boton in at.button if "Añadir Nuevo" in boton.label
+        ).click())
+        tiempos["alta de movimiento"] = _ejecutar(at, pestaña=PESTAÑA_GESTION, accion=alta)
+        return {fase: round(segundos * 1000, 1) for fase, segundos in tiempos.items()}
+
+def _medir_aislado(filas, latencia_ms):
+    medir(FILAS_CALENTAMIENTO, latencia_ms)
+    return medir(filas, latencia_ms)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    parser.add_argument("--json", help="guarda los resultados para compararlos con otra ejecución")
+    args = parser.parse_args()
+
+    resultados = {}
+    for filas in args.filas:
+        with multiprocessing.get_context("spawn").Pool(1) as proceso:
+            resultados[filas] = proceso.apply(_medir_aislado, (filas, args.latencia_ms))
+        print(f"\n{filas} movimientos (latencia {args.latencia_ms:g} ms por llamada)")
+        for fase, ms in resultados[filas].items():
+            print(f"  {fase:<28} {ms:10.1f} ms")
+    if args.json:
+        Path(args.json).write_text(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
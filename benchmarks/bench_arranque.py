@@ -0,0 +1,129 @@
+"""Coste de arranque de app.py: importaciones y tiempo hasta la primera página.
+
+Uso: python benchmarks/bench_arranque.py [--filas 10000] [--latencia-ms 200] [--json salida.json]
+
+Las importaciones se miden con `python -X importtime` en un intérprete
+nuevo, en el orden en que las hace la app: primero las de la cabecera de
+app.py y luego las diferidas (`importar(...)`), que se leen del propio
+fichero. Cada módulo se apunta con lo que añadió, sin contar lo que ya
+habían cargado los anteriores.
+
+La primera página se mide en un proceso nuevo, con las instantáneas ya en
+disco, con y sin FINANZAS_ARRANQUE_RAPIDO.
+"""
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from datos_sinteticos import generar  # noqa: E402
+
+def importaciones_de_app():
+    """Módulos que app.py importa al cargarse y los que importa bajo demanda"""
+    arbol = ast.parse((RAIZ / "app.py").read_text(encoding="utf-8"))
+    al_cargar, diferidos = [], []
+    for nodo in arbol.body:
+        if isinstance(nodo, ast.Import):
+            al_cargar.extend(alias.name for alias in nodo.names)
+        elif isinstance(nodo, ast.ImportFrom) and nodo.level == 0:
+            al_cargar.append(nodo.module)
+    for nodo in ast.walk(arbol):
+        if (
+            isinstance(nodo, ast.Call) and isinstance(nodo.func, ast.Name) and nodo.func.id == "importar"
+            and nodo.args and isinstance(nodo.args[0], ast.Constant)
+        ):
+            diferidos.append(nodo.args[0].value)
+    return list(dict.fromkeys(al_cargar)), list(dict.fromkeys(diferidos))
+
+def medir_importaciones(modulos):
+    """Milisegundos que añade cada módulo importado en ese orden en un intérprete nuevo"""
+    codigo = "\n".join(f"import {modulo}" for modulo in modulos)
+    salida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=RAIZ, capture_output=True, text=True, check=True,
+    ).stderr
+    acumulado = {}
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "|" not in linea:
+            continue
+        _, total, nombre = linea.split("|")
+        if not nombre.startswith(" ") or nombre.startswith("  "):
+            continue  # solo las importaciones de primer nivel
+        if total.strip().isdigit():
+            acumulado[nombre.strip()] = acumulado.get(nombre.strip(), 0) + int(total) / 1000
+    tiempos = {}
+    for modulo in modulos:
+        # `import a.b` se apunta como `a` si el paquete aún no estaba cargado
+        partes = modulo.split(".")
+        nombres = {".".join(partes[:i]) for i in range(1, len(partes) + 1)}
+        tiempos[modulo] = round(sum(acumulado.pop(nombre, 0) for nombre in nombres), 1)
+    return tiempos
+
+PRIMERA_PAGINA = """
+import sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=600)
+at.session_state["pestaña"] = "📝 Gestión de Movimientos"
+inicio = time.perf_counter()
+at.run()
+print(time.perf_counter() - inicio)
+"""
+
+def primera_pagina(filas, latencia_ms):
+    """Segundos de la primera ejecución en un proceso nuevo, con y sin arranque rápido"""
+    resultados = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        entorno = {
+            **os.environ,
+            "FINANZAS_LIBRO_LOCAL": str(Path(carpeta) / "libro.sqlite3"),
+            "FINANZAS_DIARIO": str(Path(carpeta) / "diario.sqlite3"),
+            "FINANZAS_INSTANTANEAS": str(Path(carpeta) / "instantaneas"),
+            "FINANZAS_LATENCIA_MS": str(latencia_ms),
+        }
+        generar(entorno["FINANZAS_LIBRO_LOCAL"], filas)
+
+        def ejecutar(rapido):
+            salida = subprocess.run(
+                [sys.executable, "-c", PRIMERA_PAGINA, str(RAIZ / "app.py")],
+                env={**entorno, "FINANZAS_ARRANQUE_RAPIDO": rapido}, capture_output=True, text=True, check=True,
+            ).stdout
+            return float(salida.strip().splitlines()[-1])
+        resultados["sin instantáneas"] = ejecutar("1")
+        resultados["con instantáneas, esperando a la hoja"] = ejecutar("0")
+        resultados["con instantáneas, arranque rápido"] = ejecutar("1")
+    return {fase: round(segundos * 1000, 1) for fase, segundos in resultados.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, default=10_000)
+    parser.add_argument("--latencia-ms", type=float, default=200)
+    parser.add_argument("--json", help="guarda los resultados para seguir su evolución")
+    args = parser.parse_args()
+
+    al_cargar, diferidos = importaciones_de_app()
+    tiempos = medir_importaciones(al_cargar + diferidos)
+    resultados = {
+        "importaciones al cargar": {modulo: tiempos[modulo] for modulo in al_cargar},
+        "importaciones diferidas": {modulo: tiempos[modulo] for modulo in diferidos},
+        "primera página": primera_pagina(args.filas, args.latencia_ms),
+    }
+    for titulo, tiempos in resultados.items():
+        print(f"\n{titulo} (ms)")
+        for nombre, ms in sorted(tiempos.items(), key=lambda par: -par[1]):
+            if ms:
+                print(f"  {nombre:<40} {ms:9.1f}")
+        if titulo.startswith("importaciones"):
+            print(f"  {'total':<40} {sum(tiempos.values()):9.1f}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Formateo de importes: la lambda por fila frente a `fmt_columna`.
+
+Uso: python benchmarks/bench_formato.py [filas]
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from formato import fmt, fmt_columna  # noqa: E402
+
+# El formateador que había antes, una llamada de Python por celda
+fmt_anterior = lambda x: f"${x:,.0f}".replace(",", ".")
+
+def importes(filas, semilla=0):
+    """Importes parecidos a los reales: casi todos en miles redondos"""
+    rng = np.random.default_rng(semilla)
+    valores = rng.integers(1, 3000, filas) * 1000
+    sueltos = rng.random(filas) < 0.1
+    valores[sueltos] = rng.integers(100, 5_000_000, sueltos.sum())
+    return pd.Series(valores, dtype="int64", name="importe")
+
+def medir(funcion, repeticiones=5):
+    """Mejor tiempo, en milisegundos, de varias ejecuciones"""
+    return min(timeit.repeat(funcion, number=1, repeat=repeticiones)) * 1000
+
+def main(filas=100_000):
+    serie = importes(filas)
+    assert fmt_columna(serie).equals(serie.apply(fmt_anterior).astype(object))
+
+    def en_frio():
+        fmt.cache_clear()
+        fmt_columna(serie)
+
+    resultados = {
+        "lambda por fila (.apply)": medir(lambda: serie.apply(fmt_anterior)),
+        "fmt_columna, memo vacío": medir(en_frio),
+        "fmt_columna, memo lleno": medir(lambda: fmt_columna(serie)),
+    }
+    base = resultados["lambda por fila (.apply)"]
+    print(f"{filas} filas, {serie.nunique()} importes distintos")
+    for nombre, ms in resultados.items():
+        print(f"  {nombre:<28} {ms:9.1f} ms  x{base / ms:5.1f}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,68 @@
+"""Curva de ahorro acumulado: todos los puntos frente a la serie reducida con LTTB.
+
+Uso: python benchmarks/bench_graficos.py [filas ...]
+
+Mide lo que tarda en construirse y serializarse la figura y cuántos bytes
+se envían al navegador, que es lo que luego tiene que dibujar.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from formato import fmt_columna  # noqa: E402
+from muestreo import espaciadas, reducir_series  # noqa: E402
+
+PUNTOS_POR_SERIE = 400
+ETIQUETAS_POR_SERIE = 12
+
+def ahorros(filas, semilla=0):
+    """Un aporte por semana hacia atrás desde hoy, como en datos_sinteticos"""
+    rng = np.random.default_rng(semilla)
+    df = pd.DataFrame({
+        "fecha": pd.date_range(end=pd.Timestamp.today().normalize(), periods=filas, freq="7D"),
+        "monto": rng.integers(1, 20, filas) * 100_000,
+    })
+    df["monto_acumulado"] = df["monto"].cumsum()
+    return df
+
+def completa(df):
+    # La figura de antes: un marcador y una etiqueta por aporte
+    fig = px.line(df, x="fecha", y="monto_acumulado", markers=True)
+    fig.update_traces(texttemplate="%{y:$,.0f}", textposition="top center")
+    return fig
+
+def reducida(df):
+    serie = reducir_series(df, "fecha", "monto_acumulado", PUNTOS_POR_SERIE)
+    serie = serie.assign(etiqueta=np.where(
+        espaciadas(len(serie), ETIQUETAS_POR_SERIE), fmt_columna(serie["monto_acumulado"]), ""
+    ))
+    fig = px.line(serie, x="fecha", y="monto_acumulado", text="etiqueta", markers=len(serie) <= 60)
+    fig.update_traces(textposition="top center")
+    return fig
+
+def medir(construir, df):
+    """Milisegundos de construir y serializar la figura y bytes del JSON"""
+    inicio = time.perf_counter()
+    carga = construir(df).to_json()
+    return (time.perf_counter() - inicio) * 1000, len(carga)
+
+def main(tamaños):
+    medir(completa, ahorros(10))  # la primera figura carga las plantillas de Plotly
+    print(f"{'filas':>9} {'completa ms':>12} {'KB':>8} {'reducida ms':>12} {'KB':>8}")
+    for filas in tamaños:
+        df = ahorros(filas)
+        ms_completa, bytes_completa = medir(completa, df)
+        ms_reducida, bytes_reducida = medir(reducida, df)
+        print(
+            f"{filas:>9} {ms_completa:12.1f} {bytes_completa / 1024:8.1f} "
+            f"{ms_reducida:12.1f} {bytes_reducida / 1024:8.1f}"
+        )
+
+if __name__ == "__main__":
+    main([int(filas) for filas in sys.argv[1:]] or [100, 1_000, 10_000, 100_000])
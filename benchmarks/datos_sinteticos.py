@@ -0,0 +1,87 @@
+"""Libro local con movimientos, ahorros y metas inventados, de 1k a 1M filas.
+
+Uso: python benchmarks/datos_sinteticos.py ruta.sqlite3 [filas]
+
+El fichero se abre luego con FINANZAS_LIBRO_LOCAL=ruta.sqlite3.
+"""
+
+import sys
+import uuid
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from hoja_local import HOJAS_INICIALES, LibroLocal  # noqa: E402
+
+EPOCA_SHEETS = date(1899, 12, 30)
+CATEGORIAS = ["Alimentacion", "Transporte", "Compras", "Gastos fijos", "Salidas", "Otros"]
+NOMBRES = {
+    "Alimentacion": ["Mercado", "Almuerzo", "Panadería", "Domicilio"],
+    "Transporte": ["Gasolina", "Taxi", "Peaje", "Parqueadero"],
+    "Compras": ["Ropa", "Tecnología", "Farmacia", "Hogar"],
+    "Gastos fijos": ["Arriendo", "Servicios", "Internet", "Celular"],
+    "Salidas": ["Cine", "Restaurante", "Bar", "Viaje"],
+    "Otros": ["Regalo", "Donación", "Varios"],
+    "Ingresos": ["Salario", "Prima", "Reembolso", "Venta"],
+}
+MOVIMIENTOS_POR_DIA = 4
+
+def _serial(dia):
+    return (dia - EPOCA_SHEETS).days
+
+def _ids(n):
+    return [uuid.uuid4().hex[:16] for _ in range(n)]
+
+def movimientos(filas, rng):
+    """Unos pocos gastos al día hacia atrás desde hoy, con un ingreso de vez en cuando"""
+    hoy = _serial(date.today())
+    fechas = np.sort(hoy - rng.integers(0, max(1, filas // MOVIMIENTOS_POR_DIA), filas))
+    tipos = np.where(rng.random(filas) < 0.08, "Ingresos", rng.choice(CATEGORIAS, filas))
+    importes = np.where(
+        tipos == "Ingresos",
+        rng.integers(500, 8000, filas) * 1000,
+        rng.integers(2, 400, filas) * 1000,
+    )
+    elegidos = rng.integers(0, 12, filas)
+    nombres = [
+        f"{NOMBRES[tipo][k % len(NOMBRES[tipo])]} {i % 97}" for i, (tipo, k) in enumerate(zip(tipos, elegidos))
+    ]
+    return [
+        [int(fecha), nombre, int(importe), str(tipo), id]
+        for fecha, nombre, importe, tipo, id in zip(fechas, nombres, importes, tipos, _ids(filas))
+    ]
+
+def ahorros(filas, rng):
+    """Un aporte por semana, hacia atrás desde hoy"""
+    hoy = _serial(date.today())
+    fechas = [hoy - 7 * i for i in reversed(range(filas))]
+    montos = rng.integers(1, 20, filas) * 100_000
+    return [
+        [fecha, int(monto), f"Aporte {i + 1}", id]
+        for i, (fecha, monto, id) in enumerate(zip(fechas, montos, _ids(filas)))
+    ]
+
+def metas(filas, rng):
+    hoy = _serial(date.today())
+    return [
+        [f"Meta {i + 1}", int(rng.integers(1, 100)) * 1_000_000, hoy + int(rng.integers(30, 3000)), "", id]
+        for i, id in enumerate(_ids(filas))
+    ]
+
+def generar(ruta, filas, semilla=0):
+    """Escribe en `ruta` un libro con `filas` movimientos y ahorros y metas a juego"""
+    rng = np.random.default_rng(semilla)
+    libro = LibroLocal(ruta)
+    datos = [
+        movimientos(filas, rng),
+        ahorros(max(12, filas // 100), rng),
+        metas(max(3, filas // 10_000), rng),
+    ]
+    for id, ((_, cabecera), filas_hoja) in enumerate(zip(HOJAS_INICIALES, datos)):
+        libro.reemplazar(id, [cabecera + ["id"]] + filas_hoja)
+    return libro
+
+if __name__ == "__main__":
+    generar(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 10_000)
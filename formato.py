@@ -0,0 +1,26 @@
+"""Formato de importes en pesos colombianos ($1.234.567)"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+@lru_cache(maxsize=65536)
+def fmt(x):
+    """Un importe con separador de miles `.` y sin decimales.
+
+    Los importes se repiten mucho (cifras redondas, gastos fijos), así que
+    cada valor distinto se formatea una sola vez.
+    """
+    return f"${x:,.0f}".replace(",", ".")
+
+def fmt_columna(valores):
+    """`fmt` aplicado a una columna entera.
+
+    Se formatea cada importe distinto y el resultado se reparte a todas las
+    filas con un solo indexado de NumPy, en lugar de una llamada por fila.
+    """
+    valores = pd.Series(valores)
+    unicos, posiciones = np.unique(valores.to_numpy(), return_inverse=True)
+    textos = np.array([fmt(valor) for valor in unicos.tolist()], dtype=object)
+    return pd.Series(textos[posiciones.ravel()], index=valores.index, name=valores.name, dtype=object)
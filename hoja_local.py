@@ -0,0 +1,204 @@
+"""Libro de Google Sheets local, para ejecutar y medir la app sin credenciales.
+
+Imita solo la parte de la API que usa app.py:
+
+- `LibroLocal.worksheets()`
+- `LibroLocal.values_batch_get(rangos, params)`, con valores sin formato
+- `LibroLocal.batch_update(cuerpo)`, con peticiones `appendCells`, `updateCells`,
+  `addSheet` y `deleteDimension` (filas)
+- `HojaLocal.title`, `.id`, `.spreadsheet`, `delete_rows(inicio, fin)` y
+  `col_values(columna)`
+
+Los datos viven en memoria y, si se da una ruta, también en un SQLite que
+sobrevive entre ejecuciones. Cada llamada espera `latencia` segundos para
+simular la red.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+
+# Hojas con las que nace un libro vacío, en el orden de app.HOJAS
+HOJAS_INICIALES = [
+    ("Movimientos", ["fecha", "nombre", "importe", "tipo_movimiento"]),
+    ("Ahorros", ["fecha", "monto", "descripcion"]),
+    ("Metas", ["nombre_objetivo", "meta_total", "fecha_meta", "descripcion"]),
+]
+
+RANGO = re.compile(r"^'(?P<titulo>(?:[^']|'')*)'(?:!(?P<celdas>.*))?$")
+FILAS = re.compile(r"^[A-Z]*(?P<desde>\d*):[A-Z]*(?P<hasta>\d*)$")
+
+def _vacia(fila):
+    return all(valor == "" for valor in fila)
+
+def _recortar(filas):
+    """Quita las celdas vacías al final de cada fila y las filas vacías del final, como la API"""
+    filas = [list(fila) for fila in filas]
+    for fila in filas:
+        while fila and fila[-1] == "":
+            fila.pop()
+    while filas and not filas[-1]:
+        filas.pop()
+    return filas
+
+def _valor(celda):
+    """Valor guardado para una celda de una petición de escritura"""
+    valor = celda.get("userEnteredValue", {})
+    if "numberValue" in valor:
+        return valor["numberValue"]
+    return valor.get("stringValue", "")
+
+class HojaLocal:
+    """Una hoja del libro: una lista de filas, con la cabecera en la primera"""
+
+    def __init__(self, libro, id, title, filas):
+        self.spreadsheet = libro
+        self.id = id
+        self.title = title
+        self.filas = filas
+
+    def delete_rows(self, inicio, fin=None):
+        fin = fin or inicio
+        with self.spreadsheet.lock:
+            self.spreadsheet._esperar()
+            del self.filas[inicio - 1:fin]
+            self.spreadsheet._borrar(self, inicio, fin)
+
+    def col_values(self, columna):
+        with self.spreadsheet.lock:
+            self.spreadsheet._esperar()
+            valores = [str(fila[columna - 1]) if columna <= len(fila) else "" for fila in self.filas]
+        return _recortar([valores])[0] if valores else []
+
+class LibroLocal:
+    """Libro en memoria, opcionalmente respaldado por un fichero SQLite"""
+
+    def __init__(self, ruta=":memory:", latencia=0):
+        self.latencia = latencia
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(ruta, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS hojas (id INTEGER PRIMARY KEY, titulo TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS filas (hoja INTEGER NOT NULL, n INTEGER NOT NULL, valores TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS filas_hoja ON filas (hoja, n);
+        """)
+        if not self.db.execute("SELECT 1 FROM hojas").fetchone():
+            for id, (titulo, cabecera) in enumerate(HOJAS_INICIALES):
+                self.db.execute("INSERT INTO hojas VALUES (?, ?)", (id, titulo))
+                self.db.execute("INSERT INTO filas VALUES (?, 1, ?)", (id, json.dumps(cabecera)))
+            self.db.commit()
+        self.hojas = []
+        for id, titulo in self.db.execute("SELECT id, titulo FROM hojas ORDER BY id").fetchall():
+            filas = []
+            for n, valores in self.db.execute("SELECT n, valores FROM filas WHERE hoja = ? ORDER BY n", (id,)):
+                filas.extend([] for _ in range(n - 1 - len(filas)))
+                filas.append(json.loads(valores))
+            self.hojas.append(HojaLocal(self, id, titulo, filas))
+
+    def _esperar(self):
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def _hoja(self, id=None, titulo=None):
+        return next(hoja for hoja in self.hojas if hoja.id == id or hoja.title == titulo)
+
+    def _guardar(self, hoja, desde, hasta):
+        """Vuelca al SQLite las filas `desde`..`hasta` (desde 1) de una hoja"""
+        self.db.execute("DELETE FROM filas WHERE hoja = ? AND n BETWEEN ? AND ?", (hoja.id, desde, hasta))
+        self.db.executemany(
+            "INSERT INTO filas VALUES (?, ?, ?)",
+            [(hoja.id, n, json.dumps(hoja.filas[n - 1])) for n in range(desde, hasta + 1)],
+        )
+        self.db.commit()
+
+    def _borrar(self, hoja, inicio, fin):
+        self.db.execute("DELETE FROM filas WHERE hoja = ? AND n BETWEEN ? AND ?", (hoja.id, inicio, fin))
+        self.db.execute("UPDATE filas SET n = n - ? WHERE hoja = ? AND n > ?", (fin - inicio + 1, hoja.id, fin))
+        self.db.commit()
+
+    def reemplazar(self, id, filas):
+        """Sustituye todo el contenido de una hoja, cabecera incluida"""
+        with self.lock:
+            hoja = self._hoja(id=id)
+            hoja.filas = [list(fila) for fila in filas]
+            self.db.execute("DELETE FROM filas WHERE hoja = ?", (id,))
+            self._guardar(hoja, 1, len(hoja.filas))
+
+    def worksheets(self):
+        with self.lock:
+            self._esperar()
+            return list(self.hojas)
+
+    def values_batch_get(self, rangos, params=None):
+        respuesta = []
+        with self.lock:
+            self._esperar()
+            for rango in rangos:
+                partes = RANGO.match(rango)
+                hoja = self._hoja(titulo=partes["titulo"].replace("''", "'"))
+                filas = hoja.filas
+                if partes["celdas"]:
+                    limites = FILAS.match(partes["celdas"])
+                    desde = int(limites["desde"] or 1)
+                    hasta = int(limites["hasta"]) if limites["hasta"] else len(filas)
+                    filas = filas[desde - 1:hasta]
+                respuesta.append({"range": rango, "values": _recortar(filas)})
+        return {"valueRanges": respuesta}
+
+    def batch_update(self, cuerpo):
+        with self.lock:
+            self._esperar()
+            for peticion in cuerpo["requests"]:
+                if "appendCells" in peticion:
+                    self._anexar(peticion["appendCells"])
+                elif "updateCells" in peticion:
+                    self._actualizar(peticion["updateCells"])
+                elif "addSheet" in peticion:
+                    self._nueva_hoja(peticion["addSheet"])
+                elif "deleteDimension" in peticion:
+                    self._borrar_filas(peticion["deleteDimension"])
+                else:
+                    raise NotImplementedError(f"Petición no soportada: {list(peticion)}")
+        return {"replies": [{} for _ in cuerpo["requests"]]}
+
+    def _anexar(self, peticion):
+        hoja = self._hoja(id=peticion["sheetId"])
+        # Como en Sheets, se escribe tras la última fila con datos
+        while hoja.filas and _vacia(hoja.filas[-1]):
+            hoja.filas.pop()
+        desde = len(hoja.filas) + 1
+        hoja.filas.extend([_valor(celda) for celda in fila["values"]] for fila in peticion["rows"])
+        self.db.execute("DELETE FROM filas WHERE hoja = ? AND n >= ?", (hoja.id, desde))
+        self._guardar(hoja, desde, len(hoja.filas))
+
+    def _actualizar(self, peticion):
+        inicio = peticion["start"]
+        hoja = self._hoja(id=inicio["sheetId"])
+        primera, columna = inicio["rowIndex"], inicio["columnIndex"]
+        for i, fila in enumerate(peticion["rows"]):
+            while len(hoja.filas) <= primera + i:
+                hoja.filas.append([])
+            destino = hoja.filas[primera + i]
+            for j, celda in enumerate(fila["values"]):
+                destino.extend([""] * (columna + j + 1 - len(destino)))
+                destino[columna + j] = _valor(celda)
+        self._guardar(hoja, primera + 1, primera + len(peticion["rows"]))
+
+    def _nueva_hoja(self, peticion):
+        propiedades = peticion["properties"]
+        id = propiedades.get("sheetId", max(hoja.id for hoja in self.hojas) + 1)
+        if any(hoja.id == id or hoja.title == propiedades["title"] for hoja in self.hojas):
+            raise ValueError(f"Ya existe una hoja con id {id} o título {propiedades['title']!r}")
+        self.db.execute("INSERT INTO hojas VALUES (?, ?)", (id, propiedades["title"]))
+        self.db.commit()
+        self.hojas.append(HojaLocal(self, id, propiedades["title"], []))
+
+    def _borrar_filas(self, peticion):
+        rango = peticion["range"]
+        if rango["dimension"] != "ROWS":
+            raise NotImplementedError("Solo se borran filas")
+        hoja = self._hoja(id=rango["sheetId"])
+        del hoja.filas[rango["startIndex"]:rango["endIndex"]]
+        self._borrar(hoja, rango["startIndex"] + 1, rango["endIndex"])
@@ -0,0 +1,50 @@
+"""Reducción de series temporales largas antes de dibujarlas"""
+
+import numpy as np
+import pandas as pd
+
+def lttb(x, y, puntos):
+    """Posiciones de los `puntos` más representativos de una serie (Largest-Triangle-Three-Buckets).
+
+    Conserva el primero y el último y reparte el resto en tramos iguales; de
+    cada tramo se queda con el punto que forma el triángulo de mayor área con
+    el elegido en el tramo anterior y la media del siguiente, así que los
+    picos y los cambios de pendiente sobreviven. `x` debe ser creciente.
+    """
+    n = len(y)
+    if n <= puntos or puntos < 3:
+        return np.arange(n)
+    x = np.asarray(x)
+    if x.dtype.kind == "M":
+        x = x.view("int64")
+    x = x.astype("float64")
+    y = np.asarray(y, dtype="float64")
+    limites = np.linspace(1, n - 1, puntos - 1).astype("int64")
+    elegidos = np.empty(puntos, dtype="int64")
+    elegidos[0], elegidos[-1] = 0, n - 1
+    anterior = 0
+    for i in range(puntos - 2):
+        inicio, fin = limites[i], limites[i + 1]
+        siguiente = slice(fin, limites[i + 2] if i + 2 < len(limites) else n)
+        media_x, media_y = x[siguiente].mean(), y[siguiente].mean()
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fin] - y[anterior])
+            - (x[anterior] - x[inicio:fin]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        elegidos[i + 1] = anterior
+    return elegidos
+
+def reducir_series(df, x, y, puntos, color=None):
+    """Filas de `df` que quedan al reducir con `lttb` cada serie (una por valor de `color`)"""
+    if color is None:
+        return df.iloc[lttb(df[x], df[y], puntos)]
+    partes = [grupo.iloc[lttb(grupo[x], grupo[y], puntos)] for _, grupo in df.groupby(color, observed=True, sort=False)]
+    return pd.concat(partes) if partes else df
+
+def espaciadas(n, maximo):
+    """Máscara de `n` posiciones con `maximo` como mucho marcadas, repartidas e incluida la última"""
+    marcadas = np.zeros(n, dtype=bool)
+    if n:
+        marcadas[np.linspace(n - 1, 0, min(n, maximo)).round().astype("int64")] = True
+    return marcadas
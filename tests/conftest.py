@@ -0,0 +1,61 @@
+"""App completa sobre un libro local (ver hoja_local.py), sin credenciales"""
+
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from hoja_local import HOJAS_INICIALES, LibroLocal  # noqa: E402
+
+ENERO_2024 = 45292  # 2024-01-01 como número de serie de Sheets
+
+@pytest.fixture
+def libro(tmp_path, monkeypatch):
+    """Devuelve `crear(movimientos, ahorros, metas)`, que escribe el libro y da su ruta"""
+    monkeypatch.setenv("FINANZAS_LIBRO_LOCAL", str(tmp_path / "libro.sqlite3"))
+    monkeypatch.setenv("FINANZAS_DIARIO", str(tmp_path / "diario.sqlite3"))
+    monkeypatch.setenv("FINANZAS_INSTANTANEAS", str(tmp_path / "instantaneas"))
+    monkeypatch.setenv("FINANZAS_ARRANQUE_RAPIDO", "0")
+
+    def crear(movimientos=(), ahorros=(), metas=()):
+        libro = LibroLocal(str(tmp_path / "libro.sqlite3"))
+        for id, ((_, cabecera), filas) in enumerate(zip(HOJAS_INICIALES, [movimientos, ahorros, metas])):
+            libro.reemplazar(id, [cabecera + ["id"]] + [list(fila) for fila in filas])
+        return tmp_path / "libro.sqlite3"
+    yield crear
+    # El hilo del diario sigue vivo tras la prueba: se espera a que envíe lo
+    # suyo para que no lo escriba en el libro de la siguiente
+    diario = tmp_path / "diario.sqlite3"
+    for _ in range(100):
+        if not diario.exists():
+            break
+        with sqlite3.connect(diario) as con:
+            if not con.execute("SELECT COUNT(*) FROM pendientes").fetchone()[0]:
+                break
+        time.sleep(0.1)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+def abrir_app(pestaña):
+    """Primera ejecución de la app con la pestaña dada abierta"""
+    st.cache_resource.clear()
+    at = AppTest.from_file(str(RAIZ / "app.py"), default_timeout=60)
+    return ejecutar(at, pestaña)
+
+def ejecutar(at, pestaña):
+    # AppTest no recuerda la pestaña abierta entre ejecuciones
+    at.session_state["pestaña"] = pestaña
+    at.run()
+    assert not at.exception, at.exception[0].message
+    return at
+
+def hoja(ruta, indice):
+    """Filas (sin cabecera) de una hoja, releídas del disco"""
+    return LibroLocal(str(ruta)).worksheets()[indice].filas[1:]
@@ -0,0 +1,74 @@
+"""Archivo de años cerrados (ver "ARCHIVO POR AÑOS" en app.py)"""
+
+from conftest import ENERO_2024, abrir_app, ejecutar
+from hoja_local import LibroLocal
+
+RESUMEN = "📊 Resumen Gráfico"
+GESTION = "📝 Gestión de Movimientos"
+
+def test_archivar_un_año_no_cambia_lo_que_se_ve(libro):
+    ruta = libro(movimientos=[
+        [ENERO_2024 + 10, "Salario", 4000000, "Ingresos", "m1"],
+        [ENERO_2024 + 40, "Mercado", 85000, "Alimentacion", "m2"],
+        [ENERO_2024 + 400, "Salario", 4200000, "Ingresos", "m3"],
+        [ENERO_2024 + 800, "Cine", 30000, "Salidas", "m4"],
+    ])
+    at = abrir_app(RESUMEN)
+    antes = {}
+    for año in at.selectbox[0].options:
+        at.selectbox[0].select(año)
+        ejecutar(at, RESUMEN)
+        antes[año] = [m.value for m in at.metric]
+
+    for año in ["2024", "2025"]:
+        ejecutar(at, GESTION)
+        at.selectbox(key="año_archivar").select(año)
+        ejecutar(at, GESTION)
+        next(b for b in at.button if b.label == f"Archivar {año}").click()
+        ejecutar(at, GESTION)
+        assert not at.error, at.error[0].value
+
+    hojas = {hoja.title: hoja for hoja in LibroLocal(str(ruta)).worksheets()}
+    assert [fila[-1] for fila in hojas["Movimientos"].filas[1:]] == ["m4"]
+    assert [fila[-1] for fila in hojas["Archivo 2024"].filas[1:]] == ["m1", "m2"]
+    assert len({hojas[titulo].id for titulo in ["Archivo 2024", "Archivo 2025", "Archivo resumen"]}) == 3
+
+    despues = {}
+    for año in at.selectbox[0].options:
+        at.selectbox[0].select(año)
+        ejecutar(at, RESUMEN)
+        despues[año] = [m.value for m in at.metric]
+    assert despues == antes
+
+def test_archivar_tras_un_borrado_de_otra_sesion(libro, monkeypatch):
+    ruta = libro(movimientos=[
+        [ENERO_2024 + 400, "Borrado por otra sesión", 1000, "Otros", "x0"],
+        [ENERO_2024 + 10, "Salario", 4000000, "Ingresos", "m1"],
+        [ENERO_2024 + 40, "Mercado", 85000, "Alimentacion", "m2"],
+        [ENERO_2024 + 800, "Cine", 30000, "Salidas", "m3"],
+    ])
+    borrar = []
+    original = LibroLocal.worksheets
+
+    def worksheets(self):
+        # Entre la lectura de la hoja y el batchUpdate del archivo, otra
+        # sesión borra la primera fila y corre las demás
+        if borrar:
+            borrar.clear()
+            self.batch_update({"requests": [{"deleteDimension": {"range": {
+                "sheetId": original(self)[0].id, "dimension": "ROWS", "startIndex": 1, "endIndex": 2,
+            }}}]})
+        return original(self)
+    monkeypatch.setattr(LibroLocal, "worksheets", worksheets)
+
+    at = abrir_app(GESTION)
+    at.selectbox(key="año_archivar").select("2024")
+    ejecutar(at, GESTION)
+    borrar.append(True)
+    next(b for b in at.button if b.label == "Archivar 2024").click()
+    ejecutar(at, GESTION)
+    assert not at.error, at.error[0].value
+
+    hojas = {hoja.title: hoja for hoja in LibroLocal(str(ruta)).worksheets()}
+    assert [fila[-1] for fila in hojas["Movimientos"].filas[1:]] == ["m3"]
+    assert [fila[-1] for fila in hojas["Archivo 2024"].filas[1:]] == ["m1", "m2"]
@@ -0,0 +1,28 @@
+"""Cubo mensual ajustado tras las altas y bajas (ver `_ajustar_cubo` en app.py)"""
+
+from conftest import ENERO_2024, abrir_app, ejecutar, hoja
+
+RESUMEN = "📊 Resumen Gráfico"
+GESTION = "📝 Gestión de Movimientos"
+
+def test_eliminar_un_movimiento_sin_fecha(libro):
+    ruta = libro(movimientos=[
+        [ENERO_2024, "Salario", 4000000, "Ingresos", "m1"],
+        ["", "Sin fecha", 50000, "Alimentacion", "m2"],
+        [ENERO_2024 + 40, "Mercado", 85000, "Alimentacion", "m3"],
+    ])
+    at = abrir_app(RESUMEN)
+    antes = [m.value for m in at.metric]
+
+    ejecutar(at, GESTION)
+    next(b for b in at.button if b.label == "➖ Eliminar Movimiento").click()
+    ejecutar(at, GESTION)
+    at.button(key="del_m2").click()
+    ejecutar(at, GESTION)
+    at.button(key="confirm_m2").click()
+    ejecutar(at, GESTION)
+    assert not at.error, at.error[0].value
+    assert [fila[-1] for fila in hoja(ruta, 0)] == ["m1", "m3"]
+
+    ejecutar(at, RESUMEN)
+    assert [m.value for m in at.metric] == antes
@@ -0,0 +1,34 @@
+"""Trazas y perfil del panel de diagnóstico (ver "TRAZAS" en app.py)"""
+
+from conftest import ENERO_2024, abrir_app, ejecutar
+
+GESTION = "📝 Gestión de Movimientos"
+
+def test_perfil_cortado_por_un_rerun_se_cierra(libro, monkeypatch):
+    monkeypatch.setenv("FINANZAS_DIAGNOSTICO", "1")
+    libro(movimientos=[[ENERO_2024, "Salario", 5000, "Ingresos", "m1"]])
+    at = abrir_app(GESTION)
+    next(b for b in at.button if "Añadir Nuevo" in b.label).click()
+    ejecutar(at, GESTION)
+
+    # El alta termina con st.rerun(): la ejecución perfilada no llega al final
+    at.query_params["perfil"] = "1"
+    at.text_input[0].set_value("café")
+    at.number_input[0].set_value(4500)
+    next(b for b in at.button if b.label == "Agregar").click()
+    ejecutar(at, GESTION)
+
+    assert "perfil_en_curso" not in at.session_state
+    # El perfil es el de la ejecución cortada, no el de la que la relanzó
+    assert "guardar_movimiento" in at.session_state["perfil"]
+    assert "perfil" not in at.query_params
+
+def test_sin_diagnostico_los_parametros_no_hacen_nada(libro):
+    libro(movimientos=[[ENERO_2024, "Salario", 5000, "Ingresos", "m1"]])
+    at = abrir_app(GESTION)
+    at.query_params["diagnostico"] = "1"
+    at.query_params["perfil"] = "1"
+    ejecutar(at, GESTION)
+
+    assert not [e for e in at.expander if "Diagnóstico" in e.label]
+    assert "perfil" not in at.session_state
@@ -0,0 +1,53 @@
+"""Importación de extractos CSV (ver "IMPORTACIÓN DE EXTRACTOS" en app.py)"""
+
+import io
+
+import streamlit as st
+
+from conftest import ENERO_2024, abrir_app, ejecutar
+
+GESTION = "📝 Gestión de Movimientos"
+
+class Subido(io.BytesIO):
+    name = "extracto.csv"
+
+def importar(at, monkeypatch, lineas):
+    monkeypatch.setattr(st, "file_uploader", lambda *a, **k: Subido("\n".join(lineas).encode()))
+    next(b for b in at.button if "Importar Extracto" in b.label).click()
+    ejecutar(at, GESTION)
+    next(b for b in at.button if b.label == "Importar").click()
+    ejecutar(at, GESTION)
+    assert not at.error, at.error[0].value
+    return at.success[0].value
+
+def test_no_repite_lo_apuntado_a_mano_con_su_categoria(libro, monkeypatch):
+    # Apuntados a mano con su categoría; el extracto solo sabe el signo
+    libro(movimientos=[
+        [ENERO_2024 + 2, "Mercado", 85000, "Alimentacion", "m1"],
+        [ENERO_2024 + 3, "Gasolina", 120000, "Transporte", "m2"],
+        [ENERO_2024 + 5, "Salario", 4000000, "Ingresos", "m3"],
+    ])
+    at = abrir_app(GESTION)
+    resultado = importar(at, monkeypatch, [
+        "Fecha;Descripción;Valor",
+        "03/01/2024;MERCADO ;-85.000",
+        "04/01/2024;Gasolina;-120.000",
+        "06/01/2024;Salario;4.000.000",
+        "07/01/2024;Cine;-30.000",
+    ])
+
+    assert resultado.startswith("1 movimientos importados · 3 ya estaban")
+
+def test_fecha_valor_no_es_el_importe(libro, monkeypatch):
+    libro(movimientos=[[ENERO_2024, "Salario", 4000000, "Ingresos", "m1"]])
+    at = abrir_app(GESTION)
+    monkeypatch.setattr(st, "file_uploader", lambda *a, **k: Subido(
+        "Fecha valor;Fecha;Concepto;Valor\n04/01/2024;03/01/2024;Mercado;-85.000".encode()
+    ))
+    next(b for b in at.button if "Importar Extracto" in b.label).click()
+    ejecutar(at, GESTION)
+
+    propuestas = {s.label: s.value for s in at.selectbox if s.label.startswith("Columna")}
+    assert propuestas["Columna de fecha"] == "Fecha"
+    assert propuestas["Columna de nombre"] == "Concepto"
+    assert propuestas["Columna de importe"] == "Valor"
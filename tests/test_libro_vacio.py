@@ -0,0 +1,37 @@
+"""La app sobre un libro nuevo, sin movimientos (ver HOJAS_INICIALES en hoja_local.py)"""
+
+import pytest
+
+from conftest import abrir_app, ejecutar, hoja
+
+PESTAÑAS = [
+    "📊 Resumen Gráfico",
+    "📝 Gestión de Movimientos",
+    "📋 Detalle Mensual",
+    "📜 Lista de Movimientos",
+    "💰 Ahorros y Metas",
+]
+GESTION = "📝 Gestión de Movimientos"
+
+@pytest.mark.parametrize("pestaña", PESTAÑAS)
+def test_cada_pestaña_se_abre_sin_movimientos(libro, pestaña):
+    libro()
+    abrir_app(pestaña)
+
+def test_primer_movimiento(libro):
+    ruta = libro()
+    at = abrir_app(PESTAÑAS[0])
+    assert at.info and "Aún no hay movimientos" in at.info[0].value
+
+    ejecutar(at, GESTION)
+    next(b for b in at.button if "Añadir Nuevo" in b.label).click()
+    ejecutar(at, GESTION)
+    at.text_input[0].set_value("Salario")
+    at.number_input[0].set_value(4000000)
+    next(b for b in at.button if b.label == "Agregar").click()
+    ejecutar(at, GESTION)
+    assert not at.error, at.error[0].value
+
+    ejecutar(at, PESTAÑAS[0])
+    assert not at.info
+    assert len(at.selectbox[0].options) == 1
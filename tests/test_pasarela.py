@@ -0,0 +1,34 @@
+"""Reintentos de la pasarela de la API (ver "PASARELA DE LA API" en app.py)"""
+
+import requests
+
+from conftest import ENERO_2024, abrir_app, ejecutar, hoja
+from hoja_local import HojaLocal
+
+GESTION = "📝 Gestión de Movimientos"
+
+def test_no_repite_un_borrado_que_pudo_aplicarse(libro, monkeypatch):
+    ruta = libro(movimientos=[
+        [ENERO_2024 + i, f"mov {i}", 1000 * (i + 1), "Otros", f"m{i}"] for i in range(5)
+    ])
+    borrados = []
+    original = HojaLocal.delete_rows
+
+    def borrar_y_cortar(self, inicio, fin=None):
+        # La fila se borra en la hoja, pero la respuesta no llega
+        borrados.append(inicio)
+        original(self, inicio, fin)
+        raise requests.exceptions.ConnectionError("conexión cortada")
+    monkeypatch.setattr(HojaLocal, "delete_rows", borrar_y_cortar)
+
+    at = abrir_app(GESTION)
+    next(b for b in at.button if "Eliminar Movimiento" in b.label).click()
+    ejecutar(at, GESTION)
+    at.button(key="del_m2").click()
+    ejecutar(at, GESTION)
+    at.button(key="confirm_m2").click()
+    ejecutar(at, GESTION)
+
+    assert borrados == [4]
+    assert at.error and "conexión cortada" in at.error[0].value
+    assert [fila[-1] for fila in hoja(ruta, 0)] == ["m0", "m1", "m3", "m4"]
@@ -0,0 +1,54 @@
+"""Altas, bajas y ediciones por id contra la hoja (ver "REGISTROS" en app.py)"""
+
+import sys
+
+from conftest import ENERO_2024, abrir_app, ejecutar, hoja
+from hoja_local import LibroLocal
+
+AHORROS = "💰 Ahorros y Metas"
+
+def test_editar_y_eliminar_con_montos_en_blanco(libro):
+    # Un monto vacío hace que la columna se cargue como float; las filas
+    # sueltas que se releen para verificar llegan como enteros
+    ruta = libro(movimientos=[[ENERO_2024, "Salario", 5000, "Ingresos", "m1"]], ahorros=[
+        [ENERO_2024, 1000, "con monto", "a1"],
+        [ENERO_2024 + 7, "", "sin monto", "a2"],
+        [ENERO_2024 + 14, 2500, "para borrar", "a3"],
+    ])
+    at = abrir_app(AHORROS)
+
+    at.button(key="edit_ahorro_a1").click()
+    ejecutar(at, AHORROS)
+    next(t for t in at.text_input if t.label == "Descripción").set_value("editado")
+    next(b for b in at.button if b.label == "💾 Guardar").click()
+    ejecutar(at, AHORROS)
+    assert not at.error, at.error[0].value
+    assert hoja(ruta, 1)[0] == [ENERO_2024, 1000, "editado", "a1"]
+
+    at.button(key="del_ahorro_a3").click()
+    ejecutar(at, AHORROS)
+    at.button(key="confirm_del_ahorro_a3").click()
+    ejecutar(at, AHORROS)
+    assert not at.error, at.error[0].value
+    assert [fila[-1] for fila in hoja(ruta, 1)] == ["a1", "a2"]
+
+def test_ids_nuevos_en_lotes_y_sin_el_candado(libro, monkeypatch):
+    ruta = libro(movimientos=[[ENERO_2024 + i % 700, f"mov {i}", 1000, "Otros"] for i in range(4500)])
+    lotes = []
+    original = LibroLocal.batch_update
+
+    def batch_update(self, cuerpo):
+        # El almacén es el de la llamada a `_escribir_ids` que hace la escritura
+        marco = sys._getframe()
+        while marco is not None and marco.f_code.co_name != "_escribir_ids":
+            marco = marco.f_back
+        assert marco is not None
+        for peticion in cuerpo["requests"]:
+            lotes.append((len(peticion["updateCells"]["rows"]), marco.f_locals["almacen"]["lock"].locked()))
+        return original(self, cuerpo)
+    monkeypatch.setattr(LibroLocal, "batch_update", batch_update)
+
+    abrir_app(AHORROS)
+    assert lotes == [(2000, False), (2000, False), (500, False)]
+    ids = [fila[-1] for fila in hoja(ruta, 0)]
+    assert len(set(ids)) == 4500 and "" not in ids